@@ -21,9 +21,12 @@ min_e1 = e1_min()
 max_e2 = e2_max()
 min_e2 = e2_min()
 
-import Vowel, Word, datetime
+import Vowel, Word, PhoneGrid, datetime
 from random import uniform, randint
 
+#what Game_fns.teach can change in a learner besides its phones and words (see Agent.lesson)
+LESSON = ("perception", "phone_radius", "new_vowels", "merges", "edits")
+
 class Agent:
 	"""Agents have
 	#a vowel repertoire (initially empty list of Vowels),
@@ -38,6 +41,11 @@ class Agent:
 		self.group = g #agents are appended to the population in groups
 		self.ind = a   #agent's index within its group
 		self.repertoire = [] #list of Vowels an agent "knows"
+		self.grid = None #spatial index over the repertoire, see phone_grid
+		self.users = None #phone -> words whose history has it, see word_index
+		self.users_n = 0 #words in idio that users has
+		self.settled = None #phone states known to be free of conflicts, see settle_conflicts
+		self.settled_prox = None #prox_margin that settled was found with
 		self.idio = dict()	   #of the form {"word.id": word}
 		self.length_flag = lf #True means the agent recognizes long vs short
 		self.age = 0 #agents are removed when they reach an age limit
@@ -48,6 +56,9 @@ class Agent:
 		self.name = (str(self.group)+str(self.ind)) #String id
 		self.chosen = False #micro view highlights a single agent
 		self.family = [] #list of agent ids in this agent's "nuclear family"
+		self.new_vowels = 0 #vowels added since Game_fns.count_events last looked
+		self.merges = 0 #merges since Game_fns.count_events last looked
+		self.edits = 0 #changes to the percepts of its words or to its phones, see PerceptTally
 
 		self.wall_bias = True
 		self.adaptive = adapt #defunct
@@ -75,7 +86,7 @@ class Agent:
 #
 				#use get_vowel() for the utterance instead of internal representation
 				p = w.percept
-				original_nuc = w.id.split("][")[1]
+				original_nuc = w.nucleus
 
 				if p.name != original_nuc:	#detect whether vowel has changed
 					print("{0:25}>\t{1:14}\t{2:15}".format(w.id, p.name, str(p))) 
@@ -91,9 +102,9 @@ class Agent:
 			return("baby")
 		else:
 			si.append("{0:25}{1:14}{2:15}".format("Word", "Agent's Vowel", "Formant Values"))
-			for w in sorted(self.idio.values(), key=lambda w: w.id.split("][")[1]):
+			for w in sorted(self.idio.values(), key=lambda w: w.nucleus):
 				p = w.percept
-				original_nuc = w.id.split("][")[1]
+				original_nuc = w.nucleus
 
 				if p.name != original_nuc:	#detect whether vowel has changed
 					si.append("{0:25}>\t{1:14}{2:15}".format(w.id, p.name, str(p)))
@@ -195,6 +206,7 @@ class Agent:
 		dist_vwls = set([w.percept for w in vocab])
 		#rep = [v for v in self.repertoire if v.weight > 0]
 		self.repertoire = list(dist_vwls)
+		self.grid = None
 		for w in self.idio.values():
 			w.fixed = True
 
@@ -223,8 +235,8 @@ class Agent:
 		use assimilation/deassimilation
 		resist homophone creation
 		'''
-		w_form = w.get_form() #may be an alternation
-		inc_vwl = w_form.get_vowel()
+		w.form_mask() #may be an alternation
+		inc_vwl = w.get_vowel()
 		corr_vwl = self.dissimilate( (w.onset, inc_vwl, w.coda) )
 		v = self.vowel_match_nh(corr_vwl, w)
 		
@@ -267,8 +279,8 @@ class Agent:
 		This is the method used if 'armchair mode' is on
 		'''
 		#speaker uses the word 
-		formed_word = w.get_form() #word object; may be an alternation
-		inc_vwl = formed_word.get_vowel() #vowel object; assimilation 
+		w.form_mask() #may be an alternation
+		inc_vwl = w.get_vowel() #vowel object; assimilation 
 		
 		#listener processes the word
 		corr_vwl = self.dissimilate( (w.onset, inc_vwl, w.coda) )
@@ -288,10 +300,9 @@ class Agent:
 					print("adds", v, "to repertoire", end=" ")
 					
 			else: #Agent couldn't find a match, but isn't a baby (not good)
-				whole_rep = [phone for phone in self.repertoire]
 				#print("*Something's not right in 'Agent.call_matchers()'")
 				print("*Agent couldn't find a match for", corr_vwl)
-				v = self.rec_vowel_match(corr_vwl, whole_rep)[0] #nothing matched the length
+				v = self.phone_grid().nearest(corr_vwl.e1, corr_vwl.e2)[0] #nothing matched the length
 				print("*Found possible match", v, ". Check phonology coarticulation functions.")
 				
 		else: #known vowel
@@ -361,6 +372,7 @@ class Agent:
 	def add_vowel(self, v):
 		#work-around just appends vowel directly without filtering
 		self.append_vowel(v)
+		self.new_vowels += 1
 
 
 
@@ -399,20 +411,9 @@ class Agent:
 		heaviest = 0
 		best_phone = None
 		isa_baby = self.age < 1
-		perc = self.perception
 		nh = self.no_homo
 		
-		def lm(vi, p):
-			#ld = ( (p.length > 200) == (v.length > 200) ) #old method
-			diff = abs(p.length - vi.length)
-			ld = diff <= (p.length * .5) #signal length is within 50% difference of phone length
-			return ld
-		
-		lf = self.length_flag
-		if lf:
-			rep = ((p, vpd(v, p)) for p in self.repertoire if (lm(v, p) and (vpd(v, p) <= perc)) )
-		else:
-			rep = ((p, vpd(v, p)) for p in self.repertoire if (vpd(v, p) <= perc))
+		rep = ((p, vpd(v, p)) for p in self.near_phones(v))
 
 		
 		for (phone, d) in rep: 
@@ -450,12 +451,7 @@ class Agent:
 		Will always return True if the agent has 
 		'''
 		
-		w_ons = w.onset
-		w_cod = w.coda
-		w_nuc = w.nucleus
-		phone_n = phone.name
-		pot_w = Word.Word(w_ons, w_nuc, w_cod)
-		if (phone_n != w_nuc and pot_w.id in self.idio):
+		if (phone.name != w.nucleus and w.id in self.idio):
 			return False
 		
 		return True
@@ -468,6 +464,23 @@ class Agent:
 		diff = abs(incom_v.length - intern_p.length)
 		ld = diff <= (intern_p.length * .5) #signal length is within 50% difference of phone length
 		return ld
+
+
+
+	def near_phones(self, v):
+		'''
+		Phones within perception of the signal v, in repertoire order.
+		If length_flag is on, only those of a compatible length (see length_matcher);
+		vowel_match_nh and vowel_match_rb both look their candidates up here
+		'''
+		perc = self.perception
+		grid = self.phone_grid()
+		if self.length_flag:
+			lm = self.length_matcher
+			near = grid.near(v.e1, v.e2, perc, PhoneGrid.length_window(v.length))
+			return [p for p in near if ( lm(v, p) and (v.euc(p) <= perc) )]
+		near = grid.near(v.e1, v.e2, perc)
+		return [p for p in near if (v.euc(p) <= perc)]
 			
 			
 			
@@ -480,10 +493,10 @@ class Agent:
 		no homophone consideration
 		'''
 		lm = self.length_matcher
-		rep = [phone for phone in self.repertoire if lm(v, phone)]
 		match = None
-		if len(rep):
-			match = self.rec_vowel_match(v, rep)[0]
+		found = self.phone_grid().nearest(v.e1, v.e2, lambda phone: lm(v, phone), PhoneGrid.length_window(v.length))
+		if found:
+			match = found[0]
 		if not match: 
 			print("Something's wrong with the armchair matching")
 		return match
@@ -514,41 +527,15 @@ class Agent:
 		
 		#p is the incoming signal
 		
-		def lm(v):
-			#ld = ( (p.length > 200) == (v.length > 200) ) #old method
-			diff = abs(p.length - v.length)
-			ld = diff <= (v.length * .5) #signal length is within 50% difference of phone length
-			return ld
-		
+		lm = self.length_matcher
 		lf = self.length_flag
-		if lf:
-			rep = [v for v in self.repertoire if lm(v)]
-		else:
-			rep = self.repertoire
-
-		#find the closest acoustic match
-		def rec_vowel_match(vwls):
-			if len(vwls) < 2:
-				d0 = self.euc(p, vwls[0])
-				return (vwls[0], d0)
-			else:
-				l = len(vwls)
-				m = int(l/2)
-				l_c, l_d = rec_vowel_match(vwls[:m])
-				r_c, r_d = rec_vowel_match(vwls[m:])
-				if l_d < r_d:
-					return(l_c, l_d)
-				return(r_c, r_d)
 
 		#find the heaviest match
 		#if no potentials have weight, find the closest
-			
-		perc = self.perception
 		
-		def heaviest_match(vwls):
-			neighbors = [v1 for v1 in vwls if ( (p.euc(v1) <= perc) )] # (v1.weight > 0) and
-			if (not neighbors and len(vwls)):
-				return rec_vowel_match(vwls)
+		neighbors = self.near_phones(p)
+
+		if neighbors:
 			if (len(neighbors) > 1 and self.adaptive):
 				self.perception = max([0, (self.perception-self.adaptive)]) #recognize a crowded system
 				self.phone_radius = max([0, (self.phone_radius-self.adaptive)]) #imitate signals more closely
@@ -558,14 +545,15 @@ class Agent:
 				if neighbor.weight > heaviest.weight:
 					heaviest = neighbor
 			distance = p.euc(heaviest)
-			return (heaviest, distance)
-			
-		if rep:
-			c_v, c_d = heaviest_match(rep)
-			if c_d <= self.perception:
-				return c_v
-			elif self.adaptive:	  #the closest vowel is not within perception margin
+			if distance <= self.perception:
+				return heaviest
+			elif self.adaptive:	  #the heaviest is no longer within the (narrowed) perception margin
 				self.perception += (self.adaptive/2) #adjust agent's perception
+
+		#no neighbors: the closest candidate is outside the perception margin
+		elif self.adaptive and ( (not lf and self.repertoire) or
+								 (lf and any(lm(p, v) for v in self.repertoire)) ):
+			self.perception += (self.adaptive/2) #adjust agent's perception
 			
 		return None
 		
@@ -595,6 +583,8 @@ class Agent:
 		then the agent doesn't respond.
 		Otherwise, it adds to the word's history and re-weighs its vowels'''
 		wi = w.id
+		users = self.word_index()
+		self.edits += 1
 		if wi in self.idio:
 			word = self.idio[wi]
 			word.add_hist(v)
@@ -602,11 +592,14 @@ class Agent:
 				print(", updates", w.id, end="")
 		else:
 			pn = self.phone_radius_noise
-			new_word = Word.Word(w.onset, w.nucleus, w.coda, None, pn)
-			new_word.add_hist(v)
-			self.idio[wi] = new_word
+			word = Word.Word(w.onset, w.nucleus, w.coda, None, pn)
+			word.key = w.key
+			word.add_hist(v)
+			self.idio[wi] = word
+			self.users_n += 1
 			if self.chosen:
 				print(", adds", w.id, "to vocabulary", end="")
+		add_user(users, v, word)
 				
 		#update weights
 		#self.weigh_vowels()
@@ -642,12 +635,82 @@ class Agent:
 
 			
 	def settle_conflicts(self):
+		'''
+		settle proximity confrontations between neighboring vowels,
+		with the same results as settle_conflicts_sweep.
+		The sweep only does anything if some pair of vowels conflicts,
+		and a pair can only start conflicting if one of its vowels changed
+		(moved, was reweighed or is new) since the last call.
+		So only the changed vowels are checked, against their neighbors in the grid,
+		and the full sweep runs only when one of them has a conflict.
+		'''
+		rep = self.repertoire
+		pm = self.prox_margin
+		settled = self.settled
+		if (settled is None or self.settled_prox != pm or len(settled) > 2 * len(rep)):
+			settled = dict()
+		
+		dirty = []
+		for v in rep:
+			s = settled.get(id(v))
+			if (s is None or s[1] != v.e1 or s[2] != v.e2 or s[3] != v.length or s[4] != v.weight):
+				dirty.append(v)
+		
+		if (dirty and self.find_conflict(dirty)):
+			before = [v for v in rep]
+			touched = self.settle_conflicts_sweep()
+			#phones the sweep made may conflict, and so may a pair it settled (prox <= 0 leaves it in place);
+			#the phones it never saw a conflict for are settled
+			settled = dict( (id(v), (v, v.e1, v.e2, v.length, v.weight)) for v in before )
+			for v in touched:
+				settled.pop(id(v), None)
+		else:
+			for v in dirty:
+				settled[id(v)] = (v, v.e1, v.e2, v.length, v.weight)
+		self.settled = settled
+		self.settled_prox = pm
+
+
+
+	def find_conflict(self, vowels):
+		'''
+		True if any of vowels conflicts with another phone,
+		by the test settle_conflicts_sweep uses (the earlier vowel in the repertoire sets the margin)
+		'''
+		rep = self.repertoire
+		pm = self.prox_margin
+		ld = self.length_matcher
+		grid = self.phone_grid()
+		order = grid.order
+		reach = max( 0, max([v.weight for v in rep]) + pm )
+		for d in vowels:
+			if not d.weight:
+				continue
+			d_i = order(d)
+			#ld accepts lengths within [d/1.5, 2d] one way round and [d/2, 1.5d] the other
+			for c in grid.near(d.e1, d.e2, reach, (d.length * .5 - 1, d.length * 2 + 1)):
+				if (c is d or not c.weight):
+					continue
+				if order(c) > d_i:
+					v, v1 = (d, c)
+				else:
+					v, v1 = (c, d)
+				prox = max( 0, v.weight + pm )
+				if ( (v.euc(v1) <= prox) and ld(v, v1) ):
+					return True
+		return False
+
+
+
+	def settle_conflicts_sweep(self):
 		'''settle proximity confrontations between neighboring vowels
 		   only iterate through original repertoire once
 		   i.e. don't settle conflicts from results of resolutions
-		   otherwise it may never terminate'''
+		   otherwise it may never terminate.
+		   Returns the vowels that were settled'''
 		rep = [v for v in self.repertoire]
 		perc = self.perception
+		touched = []
 
 		ld = self.length_matcher
 			
@@ -662,7 +725,10 @@ class Agent:
 					if v in n.neighbors:
 						n.neighbors.remove(v)
 					
+					touched.append(v)
+					touched.append(n)
 					self.settle(v, n) 
+		return touched
 				
 
 					
@@ -693,6 +759,8 @@ class Agent:
 		nv = Vowel.Vowel(nv_e1, nv_e2, nv_l, name)
 		for w in self.idio.values():
 			w.merge_midpoint(v1, v2, nv)
+		self.users = None
+		self.edits += 1
 
 		return nv
 
@@ -778,12 +846,24 @@ class Agent:
 			if v2n != nvn:
 				print(v2n, ">", nvn)
 				
+		#every word gets an entry for nv (with 0 counts if it never used v1 or v2)
+		users = self.word_index()
 		for w in self.idio.values():
 			w.merge_midpoint(v1, v2, nv)
+		users.pop(id(v1), None)
+		users.pop(id(v2), None)
+		users[id(nv)] = [nv, dict(self.idio)]
+		self.edits += 1
 		rep = self.repertoire
 		rep.remove(v1)
 		rep.remove(v2)
 		rep.append(nv)
+		g = self.grid
+		if g is not None:
+			g.remove(v1)
+			g.remove(v2)
+			g.add(nv)
+		self.merges += 1
 
 		
 
@@ -798,12 +878,19 @@ class Agent:
 
 		if (weaker_vwl in self.repertoire and stronger_vwl in self.repertoire):# and weaker_vwl is not stronger_vwl):
 			sv = stronger_vwl
-			words = [w for w in self.idio.values() if w.has_record(weaker_vwl)]
+			users = self.word_index()
+			words = self.words_using(weaker_vwl)
 			for w in words:
 				w.merge_absorb(weaker_vwl, sv)
+				add_user(users, sv, w)
+			users.pop(id(weaker_vwl), None)
+			self.edits += 1
 #
 
 			self.repertoire.remove(weaker_vwl)
+			if self.grid is not None:
+				self.grid.remove(weaker_vwl)
+			self.merges += 1
 
 			
 
@@ -815,24 +902,26 @@ class Agent:
 		and picks the direction (up/down/left/right) with max sum distance
 		'''
 		wv_c = self.copy_vowel(wv)
-		words = [w for w in self.idio.values() if w.has_record(wv_c)]
+		words = self.words_using(wv_c)
 		ne2, ne1 = self.get_dest(wv, sv)
 		wv.e1 = ne1
 		wv.e2 = ne2
+		self.edits += 1
 
 		if sv.length > wv.length:
 			if wv.length - 10 > 100:
 				wv.length -= 10
 		elif wv.length + 10 < 300:
 			wv.length += 10
+		if self.grid is not None:
+			self.grid.move(wv)
 		
 		for word in words:
-			ind = word.vowel_record_i(wv_c)
-			v, counts = word.vowel_hist.pop(ind)
-			if counts > word.vowel_hist[0][1]:
-				word.vowel_hist.insert(0, (wv, counts))
-			else:
-				word.vowel_hist.append((wv, counts))
+			v, counts = word.vowel_hist.pop(id(wv_c))
+			word.push_record(wv, counts)
+			add_user(self.users, wv, word)
+		if words:
+			self.users.pop(id(wv_c), None)
 #
 		if self.chosen:
 			print("\nCONFLICT:", wv_c, "shifting away from", sv, "to new position", wv)
@@ -959,7 +1048,7 @@ class Agent:
 		wv = weaker_vwl
 		wv_c = self.copy_vowel(wv)
 		sv = stronger_vwl
-		words = [w for w in self.idio.values() if w.has_record(wv_c)]
+		words = self.words_using(wv_c)
 		
 		if sv.e1 > wv.e1:
 			wv.e1 -= dist
@@ -985,14 +1074,16 @@ class Agent:
 			wv.length -= 10
 		elif (wv.length + 10 < 300):
 			wv.length += 10
+		self.edits += 1
+		if self.grid is not None:
+			self.grid.move(wv)
 
 		for word in words:
-			ind = word.vowel_record_i(wv_c)
-			v, counts = word.vowel_hist.pop(ind)
-			if counts > word.vowel_hist[0][1]:
-				word.vowel_hist.insert(0, (wv, counts))
-			else:
-				word.vowel_hist.append((wv, counts))
+			v, counts = word.vowel_hist.pop(id(wv_c))
+			word.push_record(wv, counts)
+			add_user(self.users, wv, word)
+		if words:
+			self.users.pop(id(wv_c), None)
 #
 		if self.chosen:
 			print("\nCONFLICT:", wv_c, "shifting away from", sv, "to new position", wv)
@@ -1029,21 +1120,14 @@ class Agent:
 		returns the modified vowel
 		'''
 		import Phonology
-		P = Phonology.Phonology
 		fm = Phonology.get_feature_dict() #consonant compensation methods (feature matrix)
+		ac = Phonology.apply_chain
+		chain = Phonology.chain
 		
 		onset, nucleus, coda = syllable
 		nuc = nucleus.cc()
-		c1 = P(fm[onset])
-		c2 = P(fm[coda])
-		ofl = c1.features
-		cfl = c2.features
-		for of in ofl:
-			ofns = c1.articulations
-			nuc = ofns[of]((onset, nuc, coda), 0, True)
-		for cf in cfl:
-			cfns = c2.articulations
-			nuc = cfns[cf]( (onset, nuc, coda), 2, True)
+		nuc = ac(chain(fm[onset]), (onset, nuc, coda), 0, True)
+		nuc = ac(chain(fm[coda]), (onset, nuc, coda), 2, True)
 			
 		return nuc
 
@@ -1063,13 +1147,11 @@ class Agent:
 		'''
 		import Phonology
 		import random
-		P = Phonology.Phonology
-		fm = Phonology.get_feature_dict() #consonant compensation methods (feature matrix)
+		ac = Phonology.apply_chain
+		chain = Phonology.chain
 		ps = self.pot_spreadables
 		onset, nucleus, coda = syllable
 		nuc = nucleus.cc()
-		c1 = P(fm[onset.name])
-		c2 = P(fm[coda.name])
 		
 		spread_chance = random.randint(0, 99)
 	
@@ -1094,18 +1176,9 @@ class Agent:
 				nfl.append(spreader)
 				#print(spreader, "spread from coda to nucleus")
 		
-		for of in ofl:
-			ofns = c1.articulations
-			nuc = ofns[of]( (onset, nuc, coda), 0, False)
-					
-		for nf in nfl:
-			ofns = c1.articulations
-			nf_nuc = ofns[nf]((onset, nuc, coda), 1, False)
-			nuc = nf_nuc
-			
-		for cf in cfl:
-			cfns = c2.articulations
-			nuc = cfns[cf]( (onset, nuc, coda), 2, False)
+		nuc = ac(chain(ofl), (onset, nuc, coda), 0, False)
+		nuc = ac(chain(nfl), (onset, nuc, coda), 1, False)
+		nuc = ac(chain(cfl), (onset, nuc, coda), 2, False)
 
 		return nuc
 
@@ -1118,9 +1191,144 @@ class Agent:
 			print("Agent added: ", new_v.name, new_v)
 		#Check to see if the new vowel will threaten the space of another
 		self.repertoire.append(new_v)
+		if self.grid is not None:
+			self.grid.add(new_v)
+
+
+
+	def phone_grid(self):
+		'''
+		The spatial index over the repertoire (see PhoneGrid.py).
+		Rebuilt if the repertoire list was replaced or changed from outside the Agent
+		'''
+		g = self.grid
+		rep = self.repertoire
+		if (g is None or g.rep is not rep or len(g) != len(rep)):
+			g = PhoneGrid.PhoneGrid(rep, self.perception)
+			self.grid = g
+		return g
 
 	
 		
+	def word_index(self):
+		'''
+		Inverted index from phones to the words whose history has an entry for them:
+		id(Vowel) -> [Vowel, {word id: Word}].
+		Rebuilt if the vocabulary changed from outside the Agent
+		'''
+		users = self.users
+		if (users is None or self.users_n != len(self.idio)):
+			users = dict()
+			for (wi, w) in self.idio.items():
+				for (v, c) in w.vowel_hist.values():
+					add_user(users, v, w)
+			self.users = users
+			self.users_n = len(self.idio)
+		return users
+
+
+
+	def words_using(self, v):
+		'''Words whose history has an entry for v (see Word.has_record), in no particular order'''
+		entry = self.word_index().get(id(v))
+		if entry is None:
+			return []
+		return list(entry[1].values())
+
+
+
+	def __getstate__(self):
+		#the indexes are keyed by id(), which is only good within one process
+		#(and the grid is quicker to rebuild than to send)
+		state = self.__dict__.copy()
+		state["users"] = None
+		state["settled"] = None
+		state["grid"] = None
+		return state
+
+
+
+	def known_vowels(self):
+		'''
+		Every Vowel the agent's phones and words refer to:
+		the repertoire, then any others still held by its words' percepts and histories (idiolect order)
+		'''
+		vs = list(self.repertoire)
+		seen = set(id(v) for v in vs)
+		for w in self.idio.values():
+			p = w.percept
+			if (p is not None and id(p) not in seen):
+				seen.add(id(p))
+				vs.append(p)
+			for (v, c) in w.vowel_hist.values():
+				if id(v) not in seen:
+					seen.add(id(v))
+					vs.append(v)
+		return vs
+
+
+
+	def lesson(self, known, before):
+		'''
+		What a step of learning changed, to send back from a diffuse worker (see take_lesson).
+		known is known_vowels() from before the step, and before their fields() then.
+		Vowels are sent as numbers: known[i] is i, and the new ones are numbered on from there.
+		Only the fields of new Vowels and of known ones that changed are sent,
+		and words are sent as their key, percept and history in those numbers
+		'''
+		index = dict( (id(v), i) for (i, v) in enumerate(known) )
+		new = []
+		def num(v):
+			if v is None:
+				return -1
+			i = index.get(id(v))
+			if i is None:
+				i = index[id(v)] = len(known) + len(new)
+				new.append(v)
+			return i
+		rep = [num(v) for v in self.repertoire]
+		words = [ (wi, w.key, num(w.percept), [(num(v), c) for (v, c) in w.vowel_hist.values()])
+				  for (wi, w) in self.idio.items() ]
+		changed = [ (i, v.fields()) for (i, v) in enumerate(known) if v.fields() != before[i] ]
+		return (tuple(getattr(self, k) for k in LESSON), changed, [v.fields() for v in new], rep, words)
+
+
+
+	def take_lesson(self, lesson, lexicon):
+		'''
+		Put back what lesson() sent: known Vowels are updated in place, so whatever holds them still does.
+		Must be called on the agent as it was sent (known_vowels() numbers them the same way).
+		lexicon (Convention.lexicon) supplies the words the agent learned.
+		The indexes are rebuilt as they are needed
+		'''
+		(values, changed, new, rep, words) = lesson
+		for (k, v) in zip(LESSON, values):
+			setattr(self, k, v)
+		vs = self.known_vowels()
+		for (i, f) in changed:
+			vs[i].set_fields(f)
+		for f in new:
+			v = Vowel.Vowel(0, 0, 0, None)
+			v.set_fields(f)
+			vs.append(v)
+		self.repertoire = [vs[i] for i in rep]
+		idio = self.idio
+		pn = self.phone_radius_noise
+		for (wi, key, p, hist) in words:
+			w = idio.get(wi)
+			if w is None:
+				lw = lexicon[wi]
+				w = idio[wi] = Word.Word(lw.onset, lw.nucleus, lw.coda, None, pn)
+				w.key = key
+			w.set_history([(vs[i], c) for (i, c) in hist])
+			if p >= 0:
+				w.set_percept(vs[p])
+		self.grid = None
+		self.users = None
+		self.settled = None
+
+
+
 	def get_rep(self):
 		'''returns repertoire (list type) unless rep is empty'''
 		if self.repertoire:
@@ -1153,6 +1361,7 @@ class Agent:
 	def set_rep(self, rep):
 		'''Directly replaces agent's rep. Be careful! The old one will be GONE'''
 		self.repertoire = rep
+		self.grid = None
 
 		
 
@@ -1177,6 +1386,16 @@ class Agent:
 
 
 
+def add_user(users, v, w):
+	'''Record in an Agent's word_index that word w has v in its history'''
+	entry = users.get(id(v))
+	if entry is None:
+		users[id(v)] = [v, {w.id: w}]
+	else:
+		entry[1][w.id] = w
+
+
+
 def to_hz_praat(e1, e2):
 	'''An implementation of the converter used in Praat software
 	which is based on Traunmuller's formula. '''
@@ -0,0 +1,411 @@
+'''
+Binary checkpoints of a running game, so a long run can be resumed
+in a new process (see Game_fns.save_checkpoint / resume_game).
+
+A checkpoint is a directory:
+	meta.json	game parameters and counters, random state, string tables,
+				agent families, Convention dicts (as row numbers)
+	*.npy		one typed column per field, numbered rows (see Columns.py)
+
+Vowel rows: every distinct Vowel/Prototype object reachable from
+	the population and the Convention (shared objects are stored once,
+	and come back shared)
+	v_e1, v_e2, v_length, v_weight, v_name, v_features, v_carriers, v_flags
+Segment rows (consonants) are in meta.json.
+Word rows: every Word in an idiolect or the lexicon
+	w_key, w_lex, w_onset, w_nucleus, w_coda, w_count, w_noise, w_flags,
+	w_percept, w_vowel, w_hist (offsets into h_vowel / h_count)
+	(w_key is the word's id as a name, w_lex its Word.key)
+Agent rows, in population order:
+	a_group, a_ind, a_pop, a_age, a_perception, a_phone_radius,
+	a_noise, a_prox, a_adaptive, a_prestige, a_flags, a_new_vowels, a_merges,
+	a_rep (offsets into r_vowel), a_words (offsets into i_word)
+
+Row references are -1 for None.
+Large populations can be inspected through columns(path)
+without rebuilding any objects.
+'''
+
+import os, json, random, shutil
+from array import array
+import Columns, Vowel, Prototype, Word, Segment, Agent, Convention
+
+VERSION = 2	#1 had no w_lex, a_new_vowels, a_merges (they load as lexicon keys and 0)
+
+#v_flags bits: which fields were ints (weight 0 vs 0.0 matters to Agent.settle), vowel features
+V_INT_E1, V_INT_E2, V_INT_LENGTH, V_INT_WEIGHT, V_NASAL, V_ROUNDED, V_RETRACTED = (1, 2, 4, 8, 16, 32, 64)
+#w_flags bits
+W_FIXED, W_MORPHS = (1, 2)
+#a_flags bits
+A_LENGTH_FLAG, A_CHOSEN, A_WALL_BIAS = (1, 2, 4)
+
+#Game_fns attributes that are not simple settings
+GAME_SKIP = ("population", "convention", "languages", "micro_agent", "find_prototypes", "sample_report", "report", "pool", "pool_size")
+
+
+
+class Table:
+	'''Interns hashable values to row numbers'''
+	def __init__(self):
+		self.rows = []
+		self.index = dict()
+
+	def get(self, value):
+		i = self.index.get(value)
+		if i is None:
+			i = len(self.rows)
+			self.index[value] = i
+			self.rows.append(value)
+		return i
+
+
+
+class Writer:
+	'''Collects the rows for one checkpoint'''
+
+	def __init__(self):
+		self.names = Table()		#vowel names, word keys, ...
+		self.features = Table()		#feature tuples
+		self.vowel_rows = dict()	#id(Vowel) -> row
+		self.vowels = []			#keep the objects alive while their ids are in use
+		self.segment_rows = dict()
+		self.segments = []
+		self.word_rows = dict()
+		c = self.cols = dict()
+		for name in ("v_e1", "v_e2", "v_length", "v_weight"):
+			c[name] = array("d")
+		for name in ("v_name", "v_features", "v_flags", "w_key", "w_onset", "w_nucleus", "w_coda",
+					 "w_flags", "w_percept", "w_vowel", "h_vowel",
+					 "a_group", "a_ind", "a_pop", "a_age", "a_prestige", "a_flags", "r_vowel", "i_word"):
+			c[name] = array("i")
+		for name in ("v_carriers", "w_lex", "w_count", "w_hist", "h_count", "a_rep", "a_words",
+					 "a_new_vowels", "a_merges"):
+			c[name] = array("q")
+		for name in ("w_noise", "a_perception", "a_phone_radius", "a_noise", "a_prox", "a_adaptive"):
+			c[name] = array("d")
+		c["w_hist"].append(0)
+		c["a_rep"].append(0)
+		c["a_words"].append(0)
+
+
+
+	def vowel(self, v):
+		if v is None:
+			return -1
+		r = self.vowel_rows.get(id(v))
+		if r is not None:
+			return r
+		c = self.cols
+		r = len(self.vowels)
+		self.vowel_rows[id(v)] = r
+		self.vowels.append(v)
+		flags = 0
+		if isinstance(v.e1, int):
+			flags |= V_INT_E1
+		if isinstance(v.e2, int):
+			flags |= V_INT_E2
+		if isinstance(v.length, int):
+			flags |= V_INT_LENGTH
+		if isinstance(v.weight, int):
+			flags |= V_INT_WEIGHT
+		if v.nasal:
+			flags |= V_NASAL
+		if v.rounded:
+			flags |= V_ROUNDED
+		if v.retracted:
+			flags |= V_RETRACTED
+		c["v_e1"].append(v.e1)
+		c["v_e2"].append(v.e2)
+		c["v_length"].append(v.length)
+		c["v_weight"].append(v.weight)
+		c["v_name"].append(self.names.get(v.name))
+		c["v_features"].append(self.features.get(tuple(v.features)))
+		c["v_carriers"].append(v.carriers if isinstance(v, Prototype.Prototype) else -1)
+		c["v_flags"].append(flags)
+		return r
+
+
+
+	def segment(self, s):
+		r = self.segment_rows.get(id(s))
+		if r is None:
+			r = len(self.segments)
+			self.segment_rows[id(s)] = r
+			self.segments.append(s)
+		return r
+
+
+
+	def word(self, key, w):
+		r = self.word_rows.get(id(w))
+		if r is not None:
+			return r
+		c = self.cols
+		r = len(c["w_key"])
+		self.word_rows[id(w)] = r
+		flags = 0
+		if w.fixed:
+			flags |= W_FIXED
+		if w.morphs:
+			flags |= W_MORPHS
+		c["w_key"].append(self.names.get(key))
+		c["w_lex"].append(w.key)
+		c["w_onset"].append(self.segment(w.onset))
+		c["w_nucleus"].append(self.names.get(w.nucleus))
+		c["w_coda"].append(self.segment(w.coda))
+		c["w_count"].append(w.count)
+		c["w_noise"].append(w.noise)
+		c["w_flags"].append(flags)
+		c["w_percept"].append(self.vowel(w.percept))
+		c["w_vowel"].append(self.vowel(w.vowel))
+		for (v, n) in w.history():
+			c["h_vowel"].append(self.vowel(v))
+			c["h_count"].append(n)
+		c["w_hist"].append(len(c["h_vowel"]))
+		return r
+
+
+
+	def agent(self, a, pop):
+		c = self.cols
+		flags = 0
+		if a.length_flag:
+			flags |= A_LENGTH_FLAG
+		if a.chosen:
+			flags |= A_CHOSEN
+		if a.wall_bias:
+			flags |= A_WALL_BIAS
+		c["a_group"].append(a.group)
+		c["a_ind"].append(a.ind)
+		c["a_pop"].append(pop)
+		c["a_age"].append(a.age)
+		c["a_perception"].append(a.perception)
+		c["a_phone_radius"].append(a.phone_radius)
+		c["a_noise"].append(a.phone_radius_noise)
+		c["a_prox"].append(a.prox_margin)
+		c["a_adaptive"].append(a.adaptive)
+		c["a_prestige"].append(a.prestige)
+		c["a_flags"].append(flags)
+		c["a_new_vowels"].append(a.new_vowels)
+		c["a_merges"].append(a.merges)
+		for v in a.repertoire:
+			c["r_vowel"].append(self.vowel(v))
+		c["a_rep"].append(len(c["r_vowel"]))
+		for (k, w) in a.idio.items():
+			c["i_word"].append(self.word(k, w))
+		c["a_words"].append(len(c["i_word"]))
+
+
+
+def vowel_dict(wr, d):
+	return [[k, wr.vowel(v)] for (k, v) in d.items()]
+
+
+
+def save(game, path):
+	'''
+	Write game to the checkpoint directory path.
+	The new checkpoint is written next to the old one and swapped in,
+	so a crash while saving leaves the previous checkpoint intact.
+	'''
+	wr = Writer()
+	c = game.convention
+
+	agents = []
+	micro = None
+	for (gi, g) in enumerate(game.population):
+		for a in g:
+			if a is game.micro_agent:
+				micro = len(agents)
+			wr.agent(a, gi)
+			agents.append({"name": a.name, "family": list(a.family), "fam": getattr(a, "fam", None)})
+
+	conv = {"lexicon": [[k, wr.word(k, w)] for (k, w) in c.lexicon.items()],
+			"proto_dict": vowel_dict(wr, c.proto_dict),
+			"base_proto_dict": vowel_dict(wr, c.base_proto_dict),
+			"base_vowel_dict": vowel_dict(wr, c.base_vowel_dict),
+			"base_weights": list(c.base_weights.items()),
+			"lf": c.lf, "lex_size": c.lex_size, "param_str": c.param_str,
+			"func_load_max": c.func_load_max, "show": c.show, "color_on": c.color_on}
+
+	settings = dict()
+	for (k, v) in vars(game).items():
+		if k in GAME_SKIP or k.startswith("_"):
+			continue
+		if (v is None or isinstance(v, (bool, int, float, str)) or
+			(isinstance(v, list) and all(isinstance(s, str) for s in v))):
+			settings[k] = v
+
+	state = random.getstate()
+	meta = {"version": VERSION,
+			"game": settings,
+			"find_prototypes": game.find_prototypes.__name__,
+			"sample_report": game.sample_report.__name__,
+			"micro_agent": micro,
+			"groups": len(game.population),
+			"random_state": [state[0], list(state[1]), state[2]],
+			"names": wr.names.rows,
+			"features": [list(f) for f in wr.features.rows],
+			"segments": [[s.name, list(s.features), s.symbol] for s in wr.segments],
+			"agents": agents,
+			"convention": conv,
+			"columns": sorted(wr.cols)}
+
+	tmp = path + ".tmp"
+	if os.path.isdir(tmp):
+		shutil.rmtree(tmp)
+	os.makedirs(tmp)
+	for (name, col) in wr.cols.items():
+		Columns.write_npy(os.path.join(tmp, name + ".npy"), col)
+	with open(os.path.join(tmp, "meta.json"), "w") as f:
+		json.dump(meta, f)
+	old = path + ".old"
+	if os.path.isdir(path):
+		if os.path.isdir(old):
+			shutil.rmtree(old)
+		os.rename(path, old)
+	os.rename(tmp, path)
+	if os.path.isdir(old):
+		shutil.rmtree(old)
+	return path
+
+
+
+def columns(path, mapped = True):
+	'''All of a checkpoint's columns by name, memory-mapped by default'''
+	with open(os.path.join(path, "meta.json")) as f:
+		meta = json.load(f)
+	return dict( (name, Columns.read_npy(os.path.join(path, name + ".npy"), mapped)) for name in meta["columns"] )
+
+
+
+def load(path, game = None):
+	'''
+	Rebuild a game from the checkpoint at path.
+	game is a Game_fns to fill in (a new one if None). Returns the game
+	'''
+	if game is None:
+		import Game_fns
+		game = Game_fns.Game_fns()
+	with open(os.path.join(path, "meta.json")) as f:
+		meta = json.load(f)
+	if meta["version"] not in (1, VERSION):
+		raise ValueError("checkpoint version {0} is not supported".format(meta["version"]))
+	c = columns(path)
+	names = meta["names"]
+	features = meta["features"]
+
+	for (k, v) in meta["game"].items():
+		setattr(game, k, v)
+	game.find_prototypes = getattr(game, meta["find_prototypes"])
+	game.sample_report = getattr(game, meta["sample_report"])
+
+	#vowels
+	V = Vowel.Vowel
+	P = Prototype.Prototype
+	vowels = []
+	for (e1, e2, l, wt, n, ft, ca, fl) in zip(c["v_e1"], c["v_e2"], c["v_length"], c["v_weight"],
+											  c["v_name"], c["v_features"], c["v_carriers"], c["v_flags"]):
+		if fl & V_INT_E1:
+			e1 = int(e1)
+		if fl & V_INT_E2:
+			e2 = int(e2)
+		if fl & V_INT_LENGTH:
+			l = int(l)
+		if fl & V_INT_WEIGHT:
+			wt = int(wt)
+		if ca >= 0:
+			v = P(e1, e2, l, names[n])
+			v.carriers = ca
+			v.weight = wt
+		else:
+			v = V(e1, e2, l, names[n], wt)
+		v.features = Vowel.intern_features(features[ft])
+		v.nasal = bool(fl & V_NASAL)
+		v.rounded = bool(fl & V_ROUNDED)
+		v.retracted = bool(fl & V_RETRACTED)
+		vowels.append(v)
+
+	def vwl(r):
+		if r < 0:
+			return None
+		return vowels[r]
+
+	segments = [Segment.Segment(n, fl, sym) for (n, fl, sym) in meta["segments"]]
+
+	#words
+	words = []
+	wh = c["w_hist"]
+	hv = c["h_vowel"]
+	hc = c["h_count"]
+	for i in range(len(c["w_key"])):
+		w = Word.Word(segments[c["w_onset"][i]], names[c["w_nucleus"][i]], segments[c["w_coda"][i]],
+					  None, c["w_noise"][i])
+		w.id = names[c["w_key"][i]]
+		if "w_lex" in c:
+			w.key = c["w_lex"][i]
+		w.count = c["w_count"][i]
+		fl = c["w_flags"][i]
+		w.fixed = bool(fl & W_FIXED)
+		w.morphs = bool(fl & W_MORPHS)
+		w.percept = vwl(c["w_percept"][i])
+		w.vowel = vwl(c["w_vowel"][i])
+		w.set_history([(vowels[hv[j]], hc[j]) for j in range(wh[i], wh[i+1])])
+		words.append(w)
+
+	#convention
+	cm = meta["convention"]
+	conv = Convention.Convention(cm["show"], cm["color_on"], cm["lex_size"])
+	conv.lexicon = dict( (k, words[r]) for (k, r) in cm["lexicon"] )
+	conv.number_lexicon(conv.lexicon)
+	if "w_lex" not in c:
+		for w in words:
+			if w.id in conv.lexicon:
+				w.key = conv.lexicon[w.id].key
+	conv.proto_dict = dict( (k, vowels[r]) for (k, r) in cm["proto_dict"] )
+	conv.base_proto_dict = dict( (k, vowels[r]) for (k, r) in cm["base_proto_dict"] )
+	conv.base_vowel_dict = dict( (k, vowels[r]) for (k, r) in cm["base_vowel_dict"] )
+	conv.base_weights = dict( (k, v) for (k, v) in cm["base_weights"] )
+	conv.lf = cm["lf"]
+	conv.param_str = cm["param_str"]
+	conv.func_load_max = cm["func_load_max"]
+	if game.use_ipa_symbols:
+		conv.plot = conv.plot_symbols
+	else:
+		conv.plot = conv.plot_spots
+	game.convention = conv
+
+	#agents
+	A = Agent.Agent
+	population = [[] for i in range(meta["groups"])]
+	ar = c["a_rep"]
+	aw = c["a_words"]
+	rv = c["r_vowel"]
+	iw = c["i_word"]
+	for (i, info) in enumerate(meta["agents"]):
+		fl = c["a_flags"][i]
+		a = A(c["a_group"][i], c["a_ind"][i], c["a_perception"][i], c["a_prox"][i], c["a_phone_radius"][i],
+			  c["a_noise"][i], bool(fl & A_LENGTH_FLAG), c["a_adaptive"][i], c["a_prestige"][i])
+		a.age = c["a_age"][i]
+		a.chosen = bool(fl & A_CHOSEN)
+		a.wall_bias = bool(fl & A_WALL_BIAS)
+		if "a_new_vowels" in c:
+			a.new_vowels = c["a_new_vowels"][i]
+			a.merges = c["a_merges"][i]
+		a.family = info["family"]
+		if info["fam"] is not None:
+			a.fam = info["fam"]
+		a.repertoire = [vowels[rv[j]] for j in range(ar[i], ar[i+1])]
+		for j in range(aw[i], aw[i+1]):
+			w = words[iw[j]]
+			a.idio[w.id] = w
+		population[c["a_pop"][i]].append(a)
+		if meta["micro_agent"] == i:
+			game.micro_agent = a
+	game.population = population
+	if meta["micro_agent"] is None:
+		game.micro_agent = None
+
+	rs = meta["random_state"]
+	random.setstate( (rs[0], tuple(rs[1]), rs[2]) )
+	return game
@@ -0,0 +1,91 @@
+'''
+Typed columns on disk in NumPy's .npy format, using only the standard library.
+Columns are array.array objects when written;
+read_npy can memory-map a file and return a memoryview over it,
+so a large column is paged in as it is used instead of being read up front.
+numpy.load reads the same files.
+'''
+
+import sys, ast, mmap
+from array import array
+
+MAGIC = b"\x93NUMPY"
+
+#array typecode -> .npy descr
+DESCRS = {"d": "<f8", "f": "<f4", "q": "<i8", "i": "<i4", "h": "<i2", "b": "|i1", "B": "|u1", "l": "<i8"}
+CODES = {"<f8": "d", "<f4": "f", "<i8": "q", "<i4": "i", "<i2": "h", "|i1": "b", "|u1": "B"}
+
+
+
+def npy_bytes(col):
+	'''The contents of a .npy file for an array.array (or list of floats)'''
+	if not isinstance(col, array):
+		col = array("d", col)
+	code = col.typecode
+	if code == "l" and col.itemsize != 8:
+		col = array("q", col)
+		code = "q"
+	descr = DESCRS[code]
+	header = "{{'descr': '{0}', 'fortran_order': False, 'shape': ({1},), }}".format(descr, len(col))
+	#pad so the data starts on a 64-byte boundary (what numpy writes)
+	pad = 64 - ((len(MAGIC) + 4 + len(header) + 1) % 64)
+	header = header + (" " * pad) + "\n"
+	if sys.byteorder == "big" and col.itemsize > 1:
+		col = array(col.typecode, col)
+		col.byteswap()
+	return MAGIC + b"\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1") + col.tobytes()
+
+
+
+def write_npy(fn, col):
+	with open(fn, "wb") as f:
+		f.write(npy_bytes(col))
+
+
+
+def parse_header(buf):
+	'''Returns (typecode, length, data offset) for the start of a .npy file'''
+	if bytes(buf[:6]) != MAGIC:
+		raise ValueError("not a .npy file")
+	major = buf[6]
+	if major == 1:
+		hl = int.from_bytes(bytes(buf[8:10]), "little")
+		start = 10
+	else:
+		hl = int.from_bytes(bytes(buf[8:12]), "little")
+		start = 12
+	header = ast.literal_eval(bytes(buf[start:start + hl]).decode("latin1"))
+	if header["fortran_order"] or len(header["shape"]) != 1:
+		raise ValueError("only 1-d C-order columns are supported")
+	descr = header["descr"]
+	if descr not in CODES:
+		raise ValueError("unsupported dtype " + descr)
+	return (CODES[descr], header["shape"][0], start + hl)
+
+
+
+def read_npy(fn, mapped = False):
+	'''
+	Read a column.
+	mapped -> a read-only memoryview over the memory-mapped file (no copy),
+	otherwise an array.array
+	'''
+	with open(fn, "rb") as f:
+		if mapped and sys.byteorder == "little":
+			mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+			code, n, offset = parse_header(memoryview(mm))
+			size = array(code).itemsize
+			return memoryview(mm)[offset:offset + n * size].cast(code)
+		data = f.read()
+	return from_bytes(data)
+
+
+
+def from_bytes(data):
+	'''An array.array from the contents of a .npy file'''
+	code, n, offset = parse_header(data)
+	col = array(code)
+	col.frombytes(data[offset:offset + n * col.itemsize])
+	if sys.byteorder == "big" and col.itemsize > 1:
+		col.byteswap()
+	return col
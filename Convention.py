@@ -3,8 +3,44 @@ Run with Vowel, Prototype, Game_fns, Agent, Word
 Also import time, random and graphics modules
 Last update July 2017 HJMS'''
 
-import Vowel, Prototype, time, random, Word, re, Agent, Segment
-from graphics import *
+import Vowel, Prototype, time, random, Word, re, Agent, Segment, IpaRaster
+
+#graphics.py starts Tk as soon as it is imported,
+#so it is only imported the first time something is drawn (see load_graphics)
+GRAPHICS_NAMES = ("GraphWin", "Point", "Circle", "Text", "Line", "Rectangle", "Oval", "Polygon", "Entry", "Image", "update")
+_graphics = None
+
+def load_graphics():
+    '''Import graphics.py and put its names in this module's namespace. Returns the module'''
+    global _graphics
+    if _graphics is None:
+        import graphics
+        g = globals()
+        for name in GRAPHICS_NAMES:
+            g[name] = getattr(graphics, name)
+        _graphics = graphics
+    return _graphics
+
+
+
+class _LazyGraphic:
+    '''Placeholder for a graphics.py name; calling it loads graphics and calls the real thing'''
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        return getattr(load_graphics(), self.name)(*args, **kwargs)
+
+for _name in GRAPHICS_NAMES:
+    globals()[_name] = _LazyGraphic(_name)
+
+
+
+def color_rgb(r, g, b):
+    '''Same as graphics.color_rgb, without needing Tk'''
+    return "#%02x%02x%02x" % (r, g, b)
+
+
 
 class Convention:
     '''
@@ -49,7 +85,10 @@ class Convention:
         self.proto_label = None         #live prototype graphic label
         self.color_key = False          #side key of proto-color map
         self.param_str = ""             #center label
+        self.nucleus_names = dict()     #word id -> nucleus name, see nucleus_of
         self.set_vowels()               #creates ipa_dict "master set"
+        self.raster_step = IpaRaster.STEP   #cell side (ERB) of the master set lookup tables
+        self.rasters = None             #(key, short, long) master set lookup tables, see ipa_rasters
         self.plot = self.plot_spots     #plot_symbols will use symbols instead
         self.func_load_max = 5
 
@@ -139,51 +178,94 @@ class Convention:
         Matches a signal imitation against ACTIVE IPA Prototypes.
         If the imitation is in fact closer to some other ACTIVE IPA proto, it will return that proto.
         If the imitation is closest to the signal it will return the signal.'''
+        return self.match_protos([im], ipa)[0]
+
+
+
+    def match_protos(self, ims, ipa = False):
+        '''
+        match_proto for a list of imitations, in order; returns their Prototypes.
+        The candidates are split by length once for the whole list,
+        and an imitation that comes up again (e.g. a phone used for several words)
+        is only matched once.
+        Ties go to the later candidate, as they always have
+        '''
         P = Prototype.Prototype
-        def lm(p):
-            if not self.lf:
-                return True
-            else:
-                return( (p.length > 200) is (im.length > 200) )
+        pd = self.proto_dict
+        lf = self.lf
 
         #use this version to match against all in master set
         #(enables splitting / phonological change):
+        #otherwise match against all active prototypes (present in base convention)
+        def candidates():
+            pool = list(self.ipa_dict.values()) if ipa else list(pd.values())
+            if not lf:
+                return (pool, pool)
+            return ([p for p in pool if not (p.length > 200)], [p for p in pool if p.length > 200])
+
+        cands = candidates()
         if ipa:
-            p_list = [p for p in self.ipa_dict.values() if lm(p)]
-            
-        #use this one to match against all active prototypes (present in base convention)        
-        else:
-            p_list = [p for p in self.proto_dict.values() if lm(p)]
-        
-
-        def rec_match_proto(protos):
-            if len(protos) < 2:
-                d0 = euc(im, protos[0])
-                if not lm(protos[0]):
-                    d0 = 999
-                return (protos[0], d0)
-            else:
-                l = len(protos)
-                mid = int(l/2)
-                left_closest, dl = rec_match_proto(protos[:mid])
-                right_closest, dr = rec_match_proto(protos[mid:])
-                if dl < dr:
-                    return (left_closest, dl)
-                return (right_closest, dr)
+            rasters = self.ipa_rasters()
+        pd_n = len(pd)
+        found = dict()  #id(imitation) -> Prototype
+        matched = []
+        for im in ims:
+            if (not ipa and len(pd) != pd_n):  #a proto was activated below; it is a candidate now
+                cands = candidates()
+                pd_n = len(pd)
+                found.clear()
+            real_proto = found.get(id(im))
+            if (real_proto is None and ipa):
+                real_proto = rasters[im.length > 200].lookup(im.e1, im.e2)
+            if real_proto is None:
+                e1 = im.e1
+                e2 = im.e2
+                best_d = None
+                for p in cands[im.length > 200]:
+                    e1_dif = (e1 - p.e1)
+                    e2_dif = (e2 - p.e2)
+                    d = ((e1_dif * e1_dif) + (e2_dif * e2_dif))**.5
+                    if (best_d is None or d <= best_d):
+                        real_proto = p
+                        best_d = d
+                if real_proto is None:
+                    raise IndexError("no prototype of a matching length for " + str(im))
+                found[id(im)] = real_proto
+            rpn = real_proto.name
+            if rpn not in pd:  #something has gone wrong, fix it
+                pd[rpn] = P(im.e1, im.e2, im.length, rpn)
                 
-        real_proto = (rec_match_proto(p_list)[0])
-        rpn = real_proto.name
-        if rpn not in self.proto_dict:  #something has gone wrong, fix it
-            self.proto_dict[rpn] = P(im.e1, im.e2, im.length, rpn)
-            
-        #activate if it hasn't been already
-        #if real_proto.name not in self.proto_dict:
-        #    self.proto_dict[real_proto.name] = real_proto
+            #activate if it hasn't been already
+            #if real_proto.name not in self.proto_dict:
+            #    self.proto_dict[real_proto.name] = real_proto
+            matched.append(real_proto)
 
-        return real_proto
+        return matched
 
     
 
+    def ipa_rasters(self):
+        '''
+        (short, long) IpaRaster lookup tables for the master set,
+        made (or read from the cache) the first time they are needed.
+        Both are the whole master set if length isn't contrastive
+        '''
+        ipa = self.ipa_dict
+        key = (id(ipa), len(ipa), self.lf, self.raster_step)
+        r = self.rasters
+        if (r is None or r[0] != key):
+            pool = list(ipa.values())
+            bounds = (self.e1_min, self.e1_max, self.e2_min, self.e2_closed_max, self.raster_step)
+            if self.lf:
+                short = IpaRaster.IpaRaster([p for p in pool if not (p.length > 200)], *bounds)
+                long = IpaRaster.IpaRaster([p for p in pool if p.length > 200], *bounds)
+            else:
+                short = long = IpaRaster.IpaRaster(pool, *bounds)
+            r = self.rasters = (key, short, long)
+        return r[1:]
+
+
+
     def activate(self, str_list, c):
         '''
         Used by trigger function (unlisted command)
@@ -467,8 +549,34 @@ class Convention:
             weight = (num_words/lex_size) * 10
             self.base_weights[n.name] = weight
 
+        self.number_lexicon(lexicon)
         return lexicon
 
+
+
+    def number_lexicon(self, lexicon):
+        '''
+        Give the words of lexicon dense int keys (0, 1, ...) in lexicon order
+        and note their nucleus names, so reports don't parse word ids
+        '''
+        nn = self.nucleus_names
+        for (i, w) in enumerate(lexicon.values()):
+            w.key = i
+            nn[w.id] = w.nucleus
+
+
+
+    def nucleus_of(self, name):
+        '''
+        The nucleus of a word id (or a Prototype named after one) e.g. "'[b][i][d]'" -> "i".
+        Lexicon words are known already; anything else is parsed once
+        '''
+        n = self.nucleus_names.get(name)
+        if n is None:
+            n = name.split("][")[1]
+            self.nucleus_names[name] = n
+        return n
+
     
 
     def cust_lexicon(self):
@@ -515,6 +623,7 @@ class Convention:
             weight = (num_words/lex_size) * 10
             self.base_weights[n.name] = weight
 
+        self.number_lexicon(lexicon)
         return lexicon  
 
 
@@ -560,6 +669,7 @@ class Convention:
                 new_word = W(onset, nucleus.name, coda, nucleus)
                 lexicon[new_word.id] = new_word
             self.base_weights[nucleus.name] = (num_words_vowel/(num_words_vowel*pl_len))
+        self.number_lexicon(lexicon)
         return lexicon  
 
 
@@ -590,6 +700,18 @@ class Convention:
         proto = P(e1_avg, e2_avg, l_avg, p_name)
         proto.carriers = nc
         return proto
+
+
+
+    def sums_to_prototype(self, nc, e1_sum, e2_sum, l_sum, p_name):
+        '''
+        Same as get_word_prototype, but from column sums
+        (see Game_fns.percept_sums) instead of a generator of Vowels.
+        nc is the number of carriers
+        '''
+        proto = Prototype.Prototype(e1_sum / nc, e2_sum / nc, l_sum / nc, p_name)
+        proto.carriers = nc
+        return proto
         
 
 
@@ -797,7 +919,7 @@ class Convention:
                 x, y = coord(pt)
                 circle = Circle(Point(x, y), 6)
                 if "[" in pt.name:
-                    p_class = ((pt.name).split("[")[2])[:-1] #"".join(re.findall("[a-zA-Z_:]+", pt.name))
+                    p_class = self.nucleus_of(pt.name)
                 else:
                     p_class = "".join(re.findall("[a-zA-Z_:]+", pt.name))
                 if self.color_on:
@@ -906,7 +1028,7 @@ class Convention:
 
                 #find out the vowel's 'true identity' 
                 if "[" in pt.name:
-                    p_class = ((pt.name).split("[")[2])[:-1] #"".join(re.findall("[a-zA-Z_:]+", pt.name))
+                    p_class = self.nucleus_of(pt.name)
                 else:
                     p_class = "".join(re.findall("[a-zA-Z_:]+", pt.name))
 
@@ -1074,7 +1196,7 @@ class Convention:
         #color-coded or gray
         for pt in rep:
             if "[" in pt.name:
-                pn = ((pt.name).split("[")[2])[:-1] #"".join(re.findall("[a-zA-Z_:]+", pt.name))
+                pn = self.nucleus_of(pt.name)
             else:
                 pn = "".join(re.findall("[a-zA-Z_:]+", pt.name))
             x, y = coord(pt)
@@ -1111,7 +1233,7 @@ class Convention:
         #color-coded or gray
         for pt in pt_list:
             if "[" in pt.name:
-                pn = ((pt.name).split("[")[2])[:-1]
+                pn = self.nucleus_of(pt.name)
             else:
                 pn = "".join(re.findall("[a-zA-Z_:]+", pt.name))
             x, y = coord(pt)
@@ -1171,7 +1293,7 @@ class Convention:
         '''
         base_names = []
         for p in protos:
-            p_class = (p.name.split("[")[2])[:-1]
+            p_class = self.nucleus_of(p.name)
             if p_class not in base_names:
                 base_names.append(p_class)
                 #self.base_proto_dict[p.name] = p
@@ -1325,7 +1447,7 @@ class Convention:
                 self.proto_label = self.side_label("", w, h2)
 
             #get distinct prototype class names for side label
-            protos = list(set([p.name.split("][")[1] for p in self.proto_dict.values()]))
+            protos = list(set([self.nucleus_of(p.name) for p in self.proto_dict.values()]))
             
             '''
             if "[" in protos[i]:
@@ -1855,8 +1977,8 @@ class Convention:
         tp = Point(win.getWidth()*.4, h)
         if len(vl) > 13:
             if "][" in vl[0].name:
-                vl1 = "["+("], [".join([v.name.split("][")[1] for v in vl[:13]]))+"],"
-                vl2 = "\n ["+("], [".join([v.name.split("][")[1] for v in vl[13:]]))+"]"
+                vl1 = "["+("], [".join([self.nucleus_of(v.name) for v in vl[:13]]))+"],"
+                vl2 = "\n ["+("], [".join([self.nucleus_of(v.name) for v in vl[13:]]))+"]"
             else:
                 vl1 = "["+("], [".join([v.name for v in vl[:13]]))+"],"
                 vl2 = "\n ["+("], [".join([v.name for v in vl[13:]]))+"]"
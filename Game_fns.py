@@ -17,10 +17,10 @@ Use 'demo' if it's your first time and you want to be walked through setup of a
 Use 'run' if you just want to see what happens with default parameters.
 '''
 
-import Vowel, Convention, Agent, Prototype, profile, Word
+import Vowel, Convention, Agent, Prototype, profile, Word, Rng, Checkpoint, PerceptTally, Speakers, Metrics, Report
 from time import ctime
-from graphics import *
-import re, datetime
+import re, datetime, random, multiprocessing, pickle
+from multiprocessing import shared_memory
 from random import sample, choice
 
 class Game_fns:
@@ -30,8 +30,15 @@ class Game_fns:
 	Each step exposes agents to Prototypes, appends a new group to the population, updates Prototypes.
 	One cycle is the number of steps required for the incoming group to complete its lifespan'''
 	
-	def __init__(self):
-		'''Sets default parameters'''
+	def __init__(self, seed = None):
+		'''
+		Sets default parameters
+		seed (any int/str) makes the game reproducible, see Rng.py
+		'''
+		self.seed = seed
+		if seed is not None:
+			Rng.reseed(seed, "init")
+		self.step_count = 0						#steps taken since the game was strapped
 		self.languages= self.set_languages()
 		self.total_interactions = 0
 		self.num_cycles = 1						#cycle = follow a group from introduction to removal i.e. birth to death
@@ -82,6 +89,19 @@ class Game_fns:
 		self.micro = False
 		self.micro_agent = None
 		self.num_repeats = 40 #MULTIPLE INTERACTIONS PER FAM MEMBER
+		self.workers = 0			#number of processes for diffuse (0 or 1 -> run in this process); off by default, see diffuse_parallel
+		self.freeze_speakers = False	#True -> learners hear the speakers as they were at the start of the step (always, with workers)
+		self.pool = None			#processes running diffuse_parallel, see get_pool
+		self.pool_size = 0
+		self.checkpoint_every = 0	#save a checkpoint every n steps (0 will disable)
+		self.checkpoint_path = "voss_checkpoint"	#checkpoint directory, see Checkpoint.py
+		self.metrics_path = ""		#directory for per-step metrics, see Metrics.py ("" will disable)
+		self.metrics_every = 1		#record metrics every n steps
+		self.metrics = None			#Metrics.Recorder writing to metrics_path
+		self.report_path = ""		#file the text report is written to as it is made, see Report.py ("" keeps it in str_buf until write_report)
+		self.report_max_bytes = 0	#start a new report part at this size (0 will disable)
+		self.report_compress = False	#gzip the report files
+		self.report = None			#Report.Sink writing to report_path
 		
 
 		self.sample_report = self.percept_sampling
@@ -91,6 +111,7 @@ class Game_fns:
 		self.margin_watcher = False
 		self.curr_cycle = 0
 		self.str_buf = []
+		self.tally = PerceptTally.PerceptTally()	#percept sums of the groups that have stopped listening
 		
 		self.armchair_var = False
 		self.functional_load = 5
@@ -220,10 +241,112 @@ class Game_fns:
 		if self.show:
 			print("Stepping...")
 			
+		sd = self.seed
+		if sd is not None:
+			Rng.reseed(sd, self.step_count, "reproduce")
 		self.reproduce()		#append list of new agents to population	
 		self.diffuse()			#signal vowels in convention to all agents
+		if sd is not None:
+			Rng.reseed(sd, self.step_count, "rest") #same stream whether or not diffuse ran in workers
 		self.increment()		#advances every current agents' development. Insert argument for number of years
+		mp = self.metrics_path
+		if mp:
+			self.count_events()	#before charon takes the oldest group's counts with it
 		self.charon()			#removes agents who have completed all cycles and increments cycle count  
+		self.step_count += 1
+		if (mp and self.step_count % self.metrics_every == 0):
+			self.get_metrics().record(self)
+		ce = self.checkpoint_every
+		if (ce and self.step_count % ce == 0):
+			self.save_checkpoint()
+
+
+
+	def save_checkpoint(self, path = None):
+		'''
+		Write the whole game state to path (default checkpoint_path),
+		so the run can be picked up later with load_checkpoint
+		'''
+		if path is None:
+			path = self.checkpoint_path
+		Checkpoint.save(self, path)
+		if self.show:
+			print("Checkpoint saved to", path)
+
+
+
+	def load_checkpoint(self, path = None):
+		'''
+		Replace this game's state with the checkpoint at path (default checkpoint_path).
+		A seeded game continues exactly as the saved run would have
+		'''
+		if path is None:
+			path = self.checkpoint_path
+		Checkpoint.load(path, self)
+		self.tally.clear()
+
+
+
+	def get_metrics(self):
+		'''The Metrics.Recorder for metrics_path, opened on first use'''
+		m = self.metrics
+		if (m is None or m.path != self.metrics_path):
+			if m is not None:
+				m.close()
+			m = self.metrics = Metrics.Recorder(self.metrics_path)
+		return m
+
+
+
+	def count_events(self):
+		'''Move the agents' new vowel and merge counts to the metrics recorder'''
+		nv = 0
+		mg = 0
+		for g in self.population:
+			for a in g:
+				nv += a.new_vowels
+				mg += a.merges
+				a.new_vowels = 0
+				a.merges = 0
+		self.get_metrics().count_events(nv, mg)
+
+
+
+	def close_metrics(self):
+		'''Write out any metrics rows still held (call at the end of a run)'''
+		if self.metrics is not None:
+			self.metrics.close()
+
+
+
+	def get_report(self):
+		'''The Report.Sink for report_path, opened on first use'''
+		r = self.report
+		if (r is None or r.path != self.report_path or
+			r.max_bytes != self.report_max_bytes or r.compress != self.report_compress):
+			if r is not None:
+				r.close()
+			r = self.report = Report.Sink(self.report_path, self.report_max_bytes, self.report_compress)
+		return r
+
+
+
+	def add_report(self, s):
+		'''Adds a section to the text report (see write_report)'''
+		if self.report_path:
+			r = self.get_report()
+			if not r.is_open():
+				r.open(self.report_header())	#built once per file
+			r.write(s)
+		else:
+			self.str_buf.append(s)
+
+
+
+	def close_report(self):
+		'''Finish the report file, if the report is going to one'''
+		if self.report is not None:
+			self.report.close()
 
 
 
@@ -243,7 +366,7 @@ class Game_fns:
 		Population size controlled by growth_rate
 		'''
 		popul = self.population
-		pot_fam = [k for k in self.get_sampling().keys()]
+		pot_fam = [a.name for g in self.speaking_groups() for a in g]
 		fam_size = min([self.fam_size, len(pot_fam)])
 		gr = self.growth_rate
 		
@@ -284,10 +407,10 @@ class Game_fns:
 		'''
 		gs = self.g_size
 		c = self.convention
-		s = self.get_sampling()
+		sp = self.get_speakers()
 
 		proto_list = c.proto_dict.keys()
-		adult_age = int(self.age_limit/10)+1
+		adult_age = self.listening_age()
 		children = (g for g in self.population if g[0].age < adult_age)
 		ta = self.total_agents
 		rpt = self.num_repeats  #MULTIPLE INTERACTIONS PER FAM MEMBER
@@ -298,7 +421,7 @@ class Game_fns:
 			self.micro_agent = choice(babies)
 			self.micro_agent.chosen = True
 
-		if not s:
+		if not len(sp):
 			#something has gone wrong; probably crazy parameters used
 			print("The language has died--agents were unable to pass on the lexicon.")
 			print("If you could please save and send your shell session or parameter values to")
@@ -310,57 +433,21 @@ class Game_fns:
 		ca = self.contact_agents
 		cw = self.contact_words
 		
-		s_keys = [s for s in s.keys()]
-		sample_size = int(min([self.lex_size, (len(s_keys)/4), ca]))
+		sample_size = int(min([self.lex_size, (len(sp)/4), ca]))
+		
+		#parallel runs: learners hear the speakers as they were at the start of the step
+		if (self.workers > 1 or self.freeze_speakers):
+			children = [g for g in children]
+			sp.freeze([a for g in children for a in g])
 		
-		t = self.transmit
 		#iterate through population
-		for g in children:
-			for a in g:
-				
-				#time0 = datetime.datetime.now()
-				
-				#get sample_size random words from population
-				random_speakers = sample(s_keys, sample_size)
-					
-				#random_words = [sample(s[rsp], min([len(s[rsp]), cw]) ) for rsp in random_speakers if len(s[rsp])]
-				#cw is the limit on how many words to get (0 for the whole vocab)
-				random_words = ( self.sample_agent_words(s[rsp], cw) for rsp in random_speakers if len(s[rsp]))
-				for rws in random_words:
-					for rw in rws:
-						
-						#time1 =  datetime.datetime.now()
-						#dif1 = time1 - time0
-						
-						#time6 = datetime.datetime.now()
-						t(a, rw) #show the random words to the learner
-						#time7 = datetime.datetime.now()
-						#dif4 = time7 - time6
-						#print(dif4)
-						
-				#time2  = datetime.datetime.now()
-				
-				#get "family" input
-				family = [f for f in a.family if f in s]
-				
-				#replace the dead family members (after a brief moment of respectful silence)
-				if len(family) < self.fam_size:
-					dead = self.fam_size - len(family)
-					new_fam = sample( [sk for sk in s_keys if sk != a.name and sk not in family and len(s[sk])], dead)
-					family.extend(new_fam)
-				
-				for i in range(rpt):
-				
-					fam_words = (self.sample_agent_words(s[member]) for member in family)
-					for ws in fam_words:
-						for w in ws:
-						
-							#time3 = datetime.datetime.now()
-							#dif2 = time3 - time2
-						
-							t(a, w)
-				#time4 = datetime.datetime.now()
-				#print(dif1+dif2)
+		if self.workers > 1:
+			learners = [a for g in children for a in g]
+			self.diffuse_parallel(learners, sp, sample_size)
+		else:
+			for g in children:
+				for a in g:
+					self.teach(a, sp, sample_size)
 		if self.show:
 			self.sample_report() #draw population repertoires
 			self.proto_report()	 #draw current Prototypes
@@ -375,34 +462,145 @@ class Game_fns:
 
 
 
-	def sample_agent_words(self, vocab, lim = 0):
-		vg = [w for w in vocab.values()]
-		if len(vg):
-			if lim:
-				return sample(vg, lim)
-			return vg
-		return None
+	def teach(self, a, sp, sample_size):
+		'''
+		One learner's input for a step:
+		words from sample_size random speakers, then num_repeats rounds of family words.
+		sp is the step's Speakers (see get_speakers)
+		'''
+		cw = self.contact_words
+		rpt = self.num_repeats  #MULTIPLE INTERACTIONS PER FAM MEMBER
+		t = self.transmit
+		if self.seed is not None:
+			Rng.reseed(self.seed, self.step_count, a.name) #each learner has its own stream
+		
+		#time0 = datetime.datetime.now()
+		
+		#get sample_size random words from population
+		random_speakers = sample(range(len(sp)), sample_size)
+			
+		#random_words = [sample(s[rsp], min([len(s[rsp]), cw]) ) for rsp in random_speakers if len(s[rsp])]
+		#cw is the limit on how many words to get (0 for the whole vocab)
+		sw = sp.sample_words
+		random_words = ( sw(rsp, cw) for rsp in random_speakers if sp.words_of(rsp) )
+		for rws in random_words:
+			for rw in rws:
+				
+				#time1 =  datetime.datetime.now()
+				#dif1 = time1 - time0
+				
+				#time6 = datetime.datetime.now()
+				t(a, rw) #show the random words to the learner
+				#time7 = datetime.datetime.now()
+				#dif4 = time7 - time6
+				#print(dif4)
+				
+		#time2  = datetime.datetime.now()
+		
+		#get "family" input
+		family = [f for f in a.family if f in sp]
+		
+		#replace the dead family members (after a brief moment of respectful silence)
+		if len(family) < self.fam_size:
+			dead = self.fam_size - len(family)
+			names = sp.names
+			new_fam = sample( [names[i] for i in range(len(sp)) if names[i] != a.name and names[i] not in family and sp.words_of(i)], dead)
+			family.extend(new_fam)
+		members = [sp.index[f] for f in family]
+		
+		for i in range(rpt):
+		
+			fam_words = (sp.words_of(m) for m in members)
+			for ws in fam_words:
+				for w in ws:
+				
+					#time3 = datetime.datetime.now()
+					#dif2 = time3 - time2
+				
+					t(a, w)
+		#time4 = datetime.datetime.now()
+		#print(dif1+dif2)
+
+
+
+	def diffuse_parallel(self, learners, sp, sample_size):
+		'''
+		Runs teach for the learners on the game's pool of self.workers processes (see get_pool).
+		The speakers' word tuples are pickled once, into shared memory every worker reads;
+		each worker also gets its shard of learners (without their indexes, see Agent.__getstate__)
+		and the step's settings (TEACH_SETTINGS).
+		sp is frozen (see Speakers.freeze), so a learner hears the speakers
+		as they were at the start of the step, whatever shard it is in.
+		Each shard gets its own random seed drawn here.
+		With a game seed, each learner draws from its own stream instead,
+		and the results are the same for any number of workers
+		(and the same as a seeded run in this process with freeze_speakers).
+		Only what changed in the learners comes back (Agent.lesson),
+		and it is put into the original Agents.
+
+		This only pays off with several cores and a big population:
+		the learners still go to the workers and back every step,
+		so with few learners per worker (or one core) it is slower than workers = 0
+		'''
+		n = min([self.workers, len(learners)])
+		shards = [learners[i::n] for i in range(n)]
+		seeds = [random.getrandbits(64) for i in range(n)]
+		settings = dict( (k, getattr(self, k)) for k in TEACH_SETTINGS )
+		data = pickle.dumps(sp, pickle.HIGHEST_PROTOCOL)
+		shm = shared_memory.SharedMemory(create = True, size = len(data))
+		try:
+			shm.buf[:len(data)] = data
+			jobs = [(seeds[i], settings, (shm.name, len(data)), sample_size, shards[i]) for i in range(n)]
+			results = self.get_pool().map(_diffuse_shard, jobs)
+		finally:
+			shm.close()
+			shm.unlink()
+		
+		lex = self.convention.lexicon
+		for ((lessons, interactions), shard) in zip(results, shards):
+			self.total_interactions += interactions
+			for (a, lesson) in zip(shard, lessons):
+				a.take_lesson(lesson, lex)
+
+
+
+	def get_pool(self):
+		'''The pool of self.workers processes for diffuse_parallel, started on first use and kept for the game'''
+		if (self.pool is None or self.pool_size != self.workers):
+			self.close_workers()
+			if "fork" in multiprocessing.get_all_start_methods():
+				ctx = multiprocessing.get_context("fork")
+			else:
+				ctx = multiprocessing.get_context()
+			self.pool = ctx.Pool(self.workers)
+			self.pool_size = self.workers
+		return self.pool
+
+
+
+	def close_workers(self):
+		'''Stop the diffuse workers, if there are any'''
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+
+
 
+	def speaking_groups(self):
+		'''The groups who speak this step (only the ancestors until there are three groups)'''
+		if len(self.population) < 3:
+			return [self.population[0]]
+		return self.population
 
 
-	
 
-	def get_sampling(self):
+	def get_speakers(self):
 		'''
-		Returns a dictionary of utterances for this step
-		i.e. {"agent name": [Word]}
+		Returns the Speakers for this step:
+		every speaking agent's words, numbered in population order
 		'''
-		sampling = dict()
-		l = len(self.population)
-		if l < 3:
-			p = [self.population[0]]
-		else:
-			p = self.population
-		for g in p:
-			for a in g:
-				#sampling[a.name] = [w for w in a.idio.values()]
-				sampling[a.name] = a.idio
-		return sampling
+		return Speakers.Speakers([a for g in self.speaking_groups() for a in g])
 
 	
 
@@ -419,8 +617,6 @@ class Game_fns:
 
 
 
-	
-
 	def increment(self):
 		'''increase age of every live agent'''
 		popul = self.population
@@ -430,6 +626,12 @@ class Game_fns:
 				a.inc_age()
 				if a.age is adult_age:
 					a.purge_vwls()
+		
+		#a group's percepts stop changing once it stops listening; tally them as it comes of age
+		tally_age = max([self.listening_age(), adult_age + 1])
+		for g in popul:
+			if (g and g[0].age == tally_age):
+				self.tally.sums(g, self.convention.lexicon)
 		chosen = self.micro_agent
 		if (chosen and chosen.age > adult_age):
 			print("\nAgent", chosen.name, "is all grown up!")
@@ -464,6 +666,7 @@ class Game_fns:
 		if a >= age_lim:
 			d = popul.pop(0)
 			self.total_agents -= len(d)	   
+			self.tally.drop(d)
 			del d
 			
 			if(popul[0][0].age >= (age_lim - 1)):  
@@ -496,22 +699,24 @@ class Game_fns:
 		the Vowels used by Agents for that word are collected and averaged.
 
 		This updates the Convention's proto_dict.
+		A word no agent has any more has no average, so it gets no prototype
+		and is noted in the report.
 		'''
 		c = self.convention
 		
 		agents = [g for g in self.population if g[0].age > min_age]
 		
-		pd = c.proto_dict
+		(count, e1_sum, e2_sum, l_sum) = self.percept_sums(agents)
 		adult_vowels = []
-		lex = c.lexicon.items()
-		for (w_id, word) in lex:
-			nuc = word.nucleus
-			word_vowels = (a.idio[w_id].percept for g in agents for a in g if w_id in a.idio)
-			if word_vowels:
-				word_proto = c.get_word_prototype(word_vowels, w_id) # word
+		for (i, w_id) in enumerate(self.tally.word_ids):
+			nc = count[i]
+			if nc:
+				word_proto = c.sums_to_prototype(nc, e1_sum[i], e2_sum[i], l_sum[i], w_id)
 				adult_vowels.append(word_proto)
 			else:
-				print("RIP", word)
+				si = "RIP " + str(c.lexicon[w_id])
+				print(si)
+				self.add_report(si)
 				
 		
 		r = self.perception + self.prox
@@ -520,6 +725,37 @@ class Game_fns:
 
 
 
+	def percept_sums(self, groups):
+		'''
+		Per-word percept (count, e1, e2, length) sums over groups,
+		in the order of self.tally.word_ids.
+		Groups that have stopped listening come from the tally;
+		only the ones still learning are scanned.
+		The sums equal a word-by-word scan of every agent up to float rounding (see PerceptTally.py)
+		'''
+		lex = self.convention.lexicon
+		tally = self.tally
+		tally.set_lexicon(lex)
+		listening = self.listening_age()
+		total = PerceptTally.zero_sums(len(lex))
+		learning = []
+		for g in groups:
+			if g[0].age >= listening:
+				PerceptTally.add_sums(total, tally.sums(g, lex))
+			else:
+				learning.append(g)
+		if learning:
+			PerceptTally.add_sums(total, tally.scan(learning))
+		return total
+
+
+
+	def listening_age(self):
+		'''diffuse only teaches groups younger than this'''
+		return int(self.age_limit/10)+1
+
+
+
 	def vowel_protos(self, min_age = 0, max_age = 100):
 		'''
 		Gets the average pronunciation for each word in lexicon.
@@ -581,7 +817,7 @@ class Game_fns:
 		sl = []
 		sol = sl.append
 
-		protos = sorted(c.proto_dict.values(), key = lambda proto: (proto.name.split("]["))[1])
+		protos = sorted(c.proto_dict.values(), key = lambda proto: c.nucleus_of(proto.name))
 		ta = self.total_agents
 		num_adults = sum([len(g) for g in self.population if g[0].age >= self.age_adult])
 		num_babies = len(self.population[-1])
@@ -615,7 +851,7 @@ class Game_fns:
 		if self.margin_watcher:
 			#c.draw_avg_margins(protos, self.perception, self.prox)
 			c.draw_base_margins(protos, self.perception, self.prox)
-		self.str_buf.append("\n".join(sl))
+		self.add_report("\n".join(sl))
 		return 1
 
 	
@@ -954,7 +1190,7 @@ class Game_fns:
 		
 		ta = self.total_agents - self.g_size #don't count the babies
 		cv = self.convention.proto_dict.values()
-		pl = sorted(cv, key=lambda proto: (proto.name.split("]["))[1])	#sorts the Prototypes by f1
+		pl = sorted(cv, key=lambda proto: self.convention.nucleus_of(proto.name))	#sorts the Prototypes by f1
 		bpd = self.convention.base_proto_dict
 		bvd = self.convention.base_vowel_dict
 		s1 = "Resulting Prototypes with {0} agent perception, {1} proximity margin".format(self.perception, self.prox)
@@ -966,7 +1202,7 @@ class Game_fns:
 		print(s2)
 		base = self.base.split(", ")
 		for p in pl:
-			p_class = (p.name.split("][")[1])
+			p_class = self.convention.nucleus_of(p.name)
 			#p_class = "".join(re.findall("[a-zA-Z_:]+", p.name))
 			if p_class in base:
 				original = bvd[p_class]
@@ -1046,32 +1282,30 @@ class Game_fns:
 		sol = s_out_li.append
 		changes = []
 		
+		#figure out what vowel each agent thinks each word has (word by word),
+		#then what IPA prototype each one matches, all in one go
+		agents = [a for g in self.population for a in g]
+		percepts = []
+		for w in lex:
+			for a in agents:
+				if w.id in a.idio: #should always be True, but check anyway
+					percepts.append(a.idio[w.id].percept)
+		protos = iter(c.match_protos(percepts, True))
+		
 		for w in lex: #every word in lexicon
 			#find original (ancestors') proto
 			anc_proto = "".join(re.findall("[a-zA-Z_:]+", w.id))
 
 			#group agents by vowel consensus
 			w_p_cntr = dict()
-			for g in self.population:
-				for a in g:
-					if w.id in a.idio: #should always be True, but check anyway
-						
-						#figure out what vowel the agent thinks it is
-						vowel = a.idio[w.id].percept
-						w_v = vowel.name
-						
-						#figure out what IPA prototype it matches
-						proto = c.match_proto(vowel, True)
-						w_p = proto.name
-						
-						#add the prototype to word vowel counter
-						if w_p in w_p_cntr:
-							w_p_cntr[w_p].append(proto)
-						else:
-							w_p_cntr[w_p] = [proto]
-							
+			for a in agents:
+				if w.id in a.idio:
+					w_p = next(protos).name
+					
+					#add the prototype to word vowel counter
+					w_p_cntr[w_p] = w_p_cntr.get(w_p, 0) + 1
 			
-			counts = [(p, len(c)) for (p, c) in w_p_cntr.items() if c]
+			counts = [(p, n) for (p, n) in w_p_cntr.items() if n]
 			counts_sorted = sorted(counts, key=lambda p: p[1], reverse=True)
 			highest = counts_sorted[0][0]
 			if (highest != anc_proto):
@@ -1089,7 +1323,7 @@ class Game_fns:
 			s_out = s_out_li[0]
 		else:
 			s_out = "No significant sound changes detected."
-		self.str_buf.append(s_out)
+		self.add_report(s_out)
 		print(s_out)
 
 	
@@ -1105,7 +1339,7 @@ class Game_fns:
 		'''
 		c = self.convention
 		lex = c.lexicon
-		lex = sorted(lex.values(), key=lambda Word: Word.id.split("][")[1])
+		lex = sorted(lex.values(), key=lambda Word: Word.nucleus)
 		s_out_li = []
 		sol = s_out_li.append
 		
@@ -1134,7 +1368,7 @@ class Game_fns:
 
 		#save for file
 		s_out = "\n".join(s_out_li)
-		self.str_buf.append(s_out)
+		self.add_report(s_out)
 
 		return(cntr)
 
@@ -1142,32 +1376,59 @@ class Game_fns:
 		
 		
 		
-	def count_near_splits(self):
+	def count_near_splits(self, report = True):
 		'''
 		Counts the number of agents who have at least one 'duplicated' vowel.
 		Duplicated means that the ancestor group had one vowel, but this agent has two.
 		 AKA a "near split"
 		Near splits may lead to lexical splits in the convention,
 		 i.e. phonological change in the language.
+		Only duplicates count: agents with a single weighted phone per IPA vowel don't
+		(this used to count every agent with any weighted IPA phone, which is nearly all of them).
+		With report False nothing is printed or added to the report (the metrics recorder uses this).
+		Returns near_split_stats()
+		'''
+		stats = self.near_split_stats()
+		if report:
+			si = str(stats[0])+" agents have near splits (two or more phones for one IPA vowel)."
+			print(si)
+			self.add_report(si)
+		return stats
+
+
+
+	def near_split_stats(self):
 		'''
+		Near splits (two or more weighted phones with the same IPA name)
+		among agents over age 0, counted in one pass over each repertoire.
+		Returns (agents, by_proto, by_cohort):
+		 the number of agents with at least one near split,
+		 {IPA name: agents with a near split of it},
+		 {group number: agents of that group with a near split}
+		'''
+		ipa = self.convention.ipa_dict
 		agent_total = 0
-		pl = self.convention.ipa_dict.values()
+		by_proto = dict()
+		by_cohort = dict()
 		for g in self.population:
+			if not (g and g[0].age > 0):
+				continue
 			agent_count = 0
-			if g[0].age > 0:
-				for a in g:
-					split_count = 0
-					for p in pl:
-						splits = [v for v in a.repertoire if (v.name is p.name and v.weight > 0)]
-						if splits:	  #agent has duplicates of p in rep
-							split_count += 1	
-					if split_count:
-						agent_count += 1
-				agent_total += agent_count
-		si = str(agent_total)+" agents have near splits."
-		print(si)
-		self.str_buf.append(si)
-		return 1
+			for a in g:
+				names = dict()	#IPA name -> weighted phones with it
+				for v in a.repertoire:
+					if v.weight > 0:
+						names[v.name] = names.get(v.name, 0) + 1
+				split = False
+				for (name, n) in names.items():
+					if (n > 1 and name in ipa):	#agent has duplicates of name in rep
+						by_proto[name] = by_proto.get(name, 0) + 1
+						split = True
+				if split:
+					agent_count += 1
+			by_cohort[g[0].group] = agent_count
+			agent_total += agent_count
+		return (agent_total, by_proto, by_cohort)
 		
 		
 		
@@ -1214,7 +1475,7 @@ class Game_fns:
 				sol(s4)
 				print(s4)
 		sl_str = "\n".join(sl)
-		self.str_buf.append(sl_str)
+		self.add_report(sl_str)
 		return 1
 
 
@@ -1542,9 +1803,13 @@ class Game_fns:
 			self.population_max = al+1
 			self.g_size = max([2, int(ags*gr)])
 		if reset:
+			if self.seed is not None:
+				Rng.reseed(self.seed, "strap")
+			self.step_count = 0
 			self.curr_cycle = 0
 			c.reset(self.base)
 			self.population = list()
+			self.tally.clear()
 			ap = self.adapt_perc
 			ancestors = [a(0, j, pm, prox, prod, noise, lf, ap, gp()) for j in range(ags)]
 			self.total_agents = ags		  
@@ -1555,6 +1820,7 @@ class Game_fns:
 			c.lf = self.length_flag
 			self.total_interactions = 0
 			self.str_buf = []
+			self.close_report()		#a new game starts a new file (or a new header, appending)
 
 		fs = self.fam_size
 		ca = self.contact_agents
@@ -1605,7 +1871,8 @@ class Game_fns:
 				ap = w.get_vowel() #assimilated vowel
 				dap = a.dissimilate( (w.onset, ap, w.coda) ) #deassimilated assimilated vowel
 				pn = a.phone_radius_noise
-				a.idio[word] = Word.Word(w.onset, w.nucleus, w.coda, dap, pn)
+				aw = a.idio[word] = Word.Word(w.onset, w.nucleus, w.coda, dap, pn)
+				aw.key = w.key
 				a.repertoire.append(dap)
 				
 		
@@ -1826,7 +2093,8 @@ class Game_fns:
 			p = w.percept
 			ap = gbm(p)
 			a.repertoire.append(ap)
-			a.idio[word] = Word.Word(w.onset, w.nucleus, w.coda, ap)
+			aw = a.idio[word] = Word.Word(w.onset, w.nucleus, w.coda, ap)
+			aw.key = w.key
 		print("Exposing population to new word . . .")
 		self.diffuse()
 		self.population.pop(0)
@@ -2639,6 +2907,8 @@ class Game_fns:
 			self.init_report()
 		while (self.curr_cycle < self.cycle_lim and pm > al): #note: cycle is incremented by charon fn
 			self.step()
+		self.close_metrics()
+		self.close_workers()
 		if self.show:
 			self.final_report()
 		conv = self.convention
@@ -2704,9 +2974,8 @@ class Game_fns:
 
 		
 
-	def write_report(self, lang = None):
-		'''prints a table with the current settings'''
-		c = self.convention
+	def report_header(self):
+		'''a table with the current settings, which the report starts with'''
 		sl = []
 		sol = sl.append
 		
@@ -2741,7 +3010,19 @@ class Game_fns:
 
 		s5 = "BASE CONVENTION\n"+self.base+"\n"
 		sol(s5)
+		return "\n".join(sl)
+
+
 
+	def write_report(self, lang = None):
+		'''
+		saves the report: a table with the current settings, then the report sections.
+		With a report_path the sections are already in that file, so it is just closed
+		'''
+		if self.report_path:
+			self.close_report()
+			print("Report written to", self.report_path)
+			return 1
 		if lang:
 			fn = self.file_name(lang)+".txt"
 		else:
@@ -2749,12 +3030,10 @@ class Game_fns:
 			fn = fn.replace(":", "")
 		print("Saving to file", fn)
 		f = open(fn, "a")
-		s_label = "\n".join(sl)
-		self.str_buf.insert(0, s_label)
+		self.str_buf.insert(0, self.report_header())
 		out = "\n".join(self.str_buf)
 		f.write(out)
 		f.close()
-		del sl
 		return 1
 		
 		
@@ -2846,6 +3125,8 @@ class Game_fns:
 					g.set_sampling_method(0, "vowels")
 					g.write_images(lang+"V")
 				
+				g.close_metrics()
+				g.close_workers()
 				print("Finished", total_cc, "on", params, "at", ctime())
 				print(g.total_interactions, "interactions performed.")
 				g.count_word_vowels(0)
@@ -2862,6 +3143,41 @@ class Game_fns:
 #	GLOBAL METHODS		#
 #########################
 
+#Game_fns settings teach reads, sent to the diffuse workers every step
+TEACH_SETTINGS = ("seed", "step_count", "contact_words", "num_repeats", "fam_size", "armchair_var")
+
+#the game a diffuse worker teaches with (see _diffuse_shard)
+_worker_game = None
+
+def _diffuse_shard(job):
+	'''
+	Pool worker: teach one shard of learners with its own seed.
+	The speakers are read from the shared memory block named in the job (see diffuse_parallel).
+	Returns the learners' lessons (see Agent.lesson) and the number of interactions.
+	'''
+	global _worker_game
+	(seed, settings, (shm_name, size), sample_size, learners) = job
+	shm = shared_memory.SharedMemory(name = shm_name)
+	try:
+		with shm.buf[:size] as data:
+			sp = pickle.loads(data)
+	finally:
+		shm.close()
+	if _worker_game is None:
+		_worker_game = Game_fns()
+	game = _worker_game
+	for (k, v) in settings.items():
+		setattr(game, k, v)
+	game.total_interactions = 0
+	random.seed(seed)
+	known = [a.known_vowels() for a in learners]
+	before = [[v.fields() for v in vs] for vs in known]
+	for a in learners:
+		game.teach(a, sp, sample_size)
+	return ([a.lesson(known[i], before[i]) for (i, a) in enumerate(learners)], game.total_interactions)
+
+
+
 def start_game(show = True):
 		'''initialize a new game with default values'''
 		default_game = Game_fns()
@@ -3095,6 +3411,8 @@ def param_archive():
 			g.shifting_report()
 			g.write_images(lang)
 		
+		g.close_metrics()
+		g.close_workers()
 		print("Finished", total_cc, "on", lang, "at", ctime())
 		print(g.total_interactions, "interactions performed.")
 		g.count_word_vowels(0)
@@ -3107,4 +3425,5 @@ def param_archive():
 		
 		
 		
-menu()
\ No newline at end of file
+if __name__ == "__main__":
+	menu()
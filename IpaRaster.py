@@ -0,0 +1,150 @@
+'''
+Nearest-prototype lookup table over the ERB chart, for the IPA master set.
+
+The chart (Convention.set_formant_limits) is cut into square cells of
+side step ERB. Each cell holds the index of the candidate nearest to every
+point in it, or -1 when the cell is near a border between two candidates
+and the answer depends on where in the cell the point is.
+A lookup reads its cell, and only searches the candidates itself
+for border cells and points off the chart.
+Answers are the same as the search: nearest by Euclidean distance,
+ties going to the later candidate.
+
+There is one table per candidate list (Convention.match_protos uses one per length class).
+Building one takes a moment, so tables are saved in CACHE_DIR
+under a hash of the candidates, the chart bounds and the step,
+and later runs read them back.
+CACHE_DIR is $VOSS_CACHE if set (an empty value turns the cache off), otherwise ~/.cache/voss.
+'''
+
+import os, hashlib
+from array import array
+import Columns
+
+STEP = .1	#cell side in ERB
+CACHE_DIR = os.environ.get("VOSS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "voss"))
+
+
+
+def nearest(e1, e2, cands):
+	'''Index of the candidate nearest to (e1, e2), ties going to the later one (-1 if no candidates)'''
+	best = -1
+	best_d = None
+	for (i, p) in enumerate(cands):
+		e1_dif = (e1 - p.e1)
+		e2_dif = (e2 - p.e2)
+		d = ((e1_dif * e1_dif) + (e2_dif * e2_dif))**.5
+		if (best_d is None or d <= best_d):
+			best = i
+			best_d = d
+	return best
+
+
+
+class IpaRaster:
+
+	def __init__(self, cands, e1_min, e1_max, e2_min, e2_max, step = STEP, cache_dir = CACHE_DIR):
+		self.cands = list(cands)
+		self.e1_min = e1_min
+		self.e2_min = e2_min
+		self.step = step
+		self.rows = int((e1_max - e1_min) / step) + 1
+		self.cols = int((e2_max - e2_min) / step) + 1
+		self.key = self.cache_key(e1_max, e2_max)
+		self.cells = None
+		if cache_dir:
+			self.cells = self.read_cache(cache_dir)
+		if self.cells is None:
+			self.cells = self.build()
+			if cache_dir:
+				self.write_cache(cache_dir)
+
+
+
+	def cache_key(self, e1_max, e2_max):
+		'''Hash of everything the table depends on'''
+		parts = [repr((self.e1_min, e1_max, self.e2_min, e2_max, self.step))]
+		parts.extend(repr((p.name, p.e1, p.e2, p.length)) for p in self.cands)
+		return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:20]
+
+
+
+	def build(self):
+		'''
+		The table: a cell gets a candidate if it beats the runner-up by more than the cell's diagonal.
+		Candidates at the same spot (e.g. a vowel and its long counterpart) count as one
+		'''
+		cands = self.cands
+		step = self.step
+		slack = (2 * step * step)**.5 + 1e-9	#twice the distance from the center to a corner, plus rounding
+		cells = array("h", [-1]) * (self.rows * self.cols)
+		if not cands:
+			return cells
+		n = 0
+		for i in range(self.rows):
+			e1 = self.e1_min + (i + .5) * step
+			for j in range(self.cols):
+				e2 = self.e2_min + (j + .5) * step
+				d1 = d2 = None
+				best = -1
+				at = None
+				for (k, p) in enumerate(cands):
+					e1_dif = (e1 - p.e1)
+					e2_dif = (e2 - p.e2)
+					d = ((e1_dif * e1_dif) + (e2_dif * e2_dif))**.5
+					if (d1 is None or d < d1):
+						(d1, d2, best, at) = (d, d1, k, (p.e1, p.e2))
+					elif (d == d1 and (p.e1, p.e2) == at):
+						best = k	#same spot as the best: the later one wins everywhere
+					elif (d2 is None or d < d2):
+						d2 = d
+				#every point of the cell is within slack/2 of the center
+				if (d2 is None or d2 - d1 > slack):
+					cells[n] = best
+				n += 1
+		return cells
+
+
+
+	def cache_file(self, cache_dir):
+		return os.path.join(cache_dir, "ipa_raster_{0}.npy".format(self.key))
+
+
+
+	def read_cache(self, cache_dir):
+		fn = self.cache_file(cache_dir)
+		try:
+			cells = Columns.read_npy(fn)
+		except (OSError, ValueError):
+			return None
+		if (cells.typecode != "h" or len(cells) != self.rows * self.cols):
+			return None
+		return cells
+
+
+
+	def write_cache(self, cache_dir):
+		'''Save the table; a cache that can't be written is skipped'''
+		fn = self.cache_file(cache_dir)
+		tmp = "{0}.{1}.tmp".format(fn, os.getpid())
+		try:
+			os.makedirs(cache_dir, exist_ok = True)
+			Columns.write_npy(tmp, self.cells)
+			os.replace(tmp, fn)
+		except OSError:
+			pass
+
+
+
+	def lookup(self, e1, e2):
+		'''The candidate nearest to (e1, e2), or None if there are no candidates'''
+		i = int((e1 - self.e1_min) // self.step)
+		j = int((e2 - self.e2_min) // self.step)
+		k = -1
+		if (0 <= i < self.rows and 0 <= j < self.cols):
+			k = self.cells[i * self.cols + j]
+		if k < 0:
+			k = nearest(e1, e2, self.cands)
+			if k < 0:
+				return None
+		return self.cands[k]
@@ -0,0 +1,186 @@
+'''
+Per-step numbers from a game, written out as the game runs.
+
+Rows build up in memory until there are chunk of them,
+then they are written as a shard: an .npz file (a zip of .npy columns, see Columns.py),
+so memory stays bounded however long the run is.
+numpy.load reads a shard; read() here gets a whole table back without NumPy.
+
+TABLES
+	steps	one row per recorded step
+		step, cycle, agents, adults, learners, interactions, new_vowels, merges, near_splits
+		(new_vowels and merges are counted since the previous recorded step,
+		near_splits is the number of agents with one, see Game_fns.count_near_splits)
+	protos	one row per lexicon word per recorded step
+		step, word, carriers, e1, e2, length
+		word is Word.key (see words.json), carriers the number of agents
+		whose percept was averaged into (e1, e2, length)
+	splits	one row per IPA vowel with near splits per recorded step
+		step, vowel, agents
+		vowel is an index into vowels.json
+	cohorts	one row per group over age 0 per recorded step
+		step, group, near_splits
+
+FILES
+	path/steps_00000.npz, path/steps_00001.npz, ...
+	path/protos_00000.npz, ...
+	path/words.json		word key -> word id
+	path/vowels.json	IPA names (the master set), indexed by splits.vowel
+A Recorder opened on a directory that already has shards carries on numbering after them
+(e.g. a run resumed from a checkpoint).
+'''
+
+import os, json, zipfile
+from array import array
+import Columns
+
+CHUNK = 4096	#rows per shard
+
+TABLES = {"steps": (("step", "q"), ("cycle", "q"), ("agents", "q"), ("adults", "q"), ("learners", "q"),
+					("interactions", "q"), ("new_vowels", "q"), ("merges", "q"), ("near_splits", "q")),
+		  "protos": (("step", "q"), ("word", "q"), ("carriers", "q"),
+					 ("e1", "d"), ("e2", "d"), ("length", "d")),
+		  "splits": (("step", "q"), ("vowel", "q"), ("agents", "q")),
+		  "cohorts": (("step", "q"), ("group", "q"), ("near_splits", "q"))}
+
+
+
+class Table:
+	'''Columns of one table that haven't been written yet'''
+
+	def __init__(self, path, name, columns, chunk):
+		self.path = path
+		self.name = name
+		self.names = [n for (n, code) in columns]
+		self.columns = columns
+		self.chunk = chunk
+		self.shard = len(shards(path, name))
+		self.clear()
+
+
+
+	def clear(self):
+		self.cols = [array(code) for (n, code) in self.columns]
+
+
+
+	def __len__(self):
+		return len(self.cols[0])
+
+
+
+	def append(self, row):
+		for (col, x) in zip(self.cols, row):
+			col.append(x)
+		if len(self) >= self.chunk:
+			self.flush()
+
+
+
+	def flush(self):
+		'''Write the rows held as the next shard'''
+		if not len(self):
+			return
+		fn = os.path.join(self.path, "{0}_{1:05d}.npz".format(self.name, self.shard))
+		tmp = fn + ".tmp"
+		with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as z:
+			for (n, col) in zip(self.names, self.cols):
+				z.writestr(n + ".npy", Columns.npy_bytes(col))
+		os.replace(tmp, fn)
+		self.shard += 1
+		self.clear()
+
+
+
+class Recorder:
+
+	def __init__(self, path, chunk = CHUNK):
+		os.makedirs(path, exist_ok = True)
+		self.path = path
+		self.tables = dict( (name, Table(path, name, cols, chunk)) for (name, cols) in TABLES.items() )
+		self.new_vowels = 0
+		self.merges = 0
+		self.vowels = None	#IPA name -> index in vowels.json
+
+
+
+	def count_events(self, new_vowels, merges):
+		'''Add events from a step that may not be recorded itself'''
+		self.new_vowels += new_vowels
+		self.merges += merges
+
+
+
+	def record(self, game):
+		'''Append this step's rows for game (call at the end of Game_fns.step)'''
+		step = game.step_count
+		popul = game.population
+		aa = game.age_adult
+		adults = sum([len(g) for g in popul if g and g[0].age >= aa])
+		c = game.convention
+		lex = c.lexicon
+		if self.vowels is None:
+			self.save_names(lex, c.ipa_dict)
+		(splitting, by_proto, by_cohort) = game.count_near_splits(False)
+		self.tables["steps"].append( (step, game.curr_cycle, game.total_agents, adults, game.total_agents - adults,
+									  game.total_interactions, self.new_vowels, self.merges, splitting) )
+		self.new_vowels = 0
+		self.merges = 0
+
+		vowels = self.vowels
+		splits = self.tables["splits"]
+		for (name, n) in by_proto.items():
+			splits.append( (step, vowels[name], n) )
+		cohorts = self.tables["cohorts"]
+		for (group, n) in by_cohort.items():
+			cohorts.append( (step, group, n) )
+
+		#the same agents find_prototypes would average
+		min_age = aa if game.avg_adults_only else 0
+		groups = [g for g in popul if g and g[0].age > min_age]
+		if not groups:
+			return
+		(count, e1_sum, e2_sum, l_sum) = game.percept_sums(groups)
+		protos = self.tables["protos"]
+		for (i, w_id) in enumerate(game.tally.word_ids):
+			nc = count[i]
+			if nc:
+				protos.append( (step, lex[w_id].key, nc, e1_sum[i] / nc, e2_sum[i] / nc, l_sum[i] / nc) )
+
+
+
+	def save_names(self, lex, ipa):
+		'''Write words.json and vowels.json, which the int columns refer to'''
+		with open(os.path.join(self.path, "words.json"), "w") as f:
+			json.dump(dict( (w.key, k) for (k, w) in lex.items() ), f, indent = 1)
+		names = sorted(ipa)
+		with open(os.path.join(self.path, "vowels.json"), "w") as f:
+			json.dump(names, f, indent = 1)
+		self.vowels = dict( (name, i) for (i, name) in enumerate(names) )
+
+
+
+	def close(self):
+		'''Write out whatever rows are held'''
+		for t in self.tables.values():
+			t.flush()
+
+
+
+def shards(path, name):
+	'''A table's shard files in path, in order'''
+	if not os.path.isdir(path):
+		return []
+	found = [fn for fn in os.listdir(path) if fn.startswith(name + "_") and fn.endswith(".npz")]
+	return [os.path.join(path, fn) for fn in sorted(found)]
+
+
+
+def read(path, name):
+	'''A whole table as {column name: array.array}, shards in order'''
+	cols = dict( (n, array(code)) for (n, code) in TABLES[name] )
+	for fn in shards(path, name):
+		with zipfile.ZipFile(fn) as z:
+			for (n, col) in cols.items():
+				col.extend(Columns.from_bytes(z.read(n + ".npy")))
+	return cols
@@ -0,0 +1,126 @@
+'''
+Running percept sums per age group, for Game_fns.percept_protos.
+
+Once a group has stopped listening (see Game_fns.diffuse) its percepts
+only change if one of its agents edits its words or phones (Agent.edits),
+so each group's per-word sums (count, e1, e2, length) are worked out once,
+when it grows up, and kept until charon removes the group.
+A prototype query then adds up one row of sums per group
+instead of rescanning every agent's idiolect.
+
+A Cohort notes the group's total of Agent.edits when it is made;
+if the total has moved, the group is rescanned on the next query.
+
+Sums are kept in lexicon order (word_ids, see set_lexicon).
+Adding them up group by group takes the floats in a different order
+from one word-by-word scan of every agent, so the totals equal that scan's
+up to float rounding (the last bit or so), not exactly.
+'''
+
+from array import array
+
+class Cohort:
+	'''Sums for one group, in the tally's word order'''
+
+	def __init__(self, size, word_ids, sums, edits):
+		self.size = size
+		self.word_ids = word_ids
+		self.sums = sums		#(count, e1_sum, e2_sum, length_sum)
+		self.edits = edits		#the group's total of Agent.edits when the sums were made
+
+
+
+class PerceptTally:
+
+	def __init__(self):
+		self.word_ids = []		#sum index -> word id
+		self.word_index = dict()	#word id -> sum index
+		self.clear()
+
+
+
+	def set_lexicon(self, lexicon):
+		'''
+		Fix the word order of the sums to the lexicon's order.
+		lexicon is the Convention's dict of word id -> Word
+		'''
+		ids = list(lexicon)
+		if ids != self.word_ids:
+			self.word_ids = ids
+			self.word_index = dict((w_id, i) for (i, w_id) in enumerate(ids))
+
+
+
+	def clear(self):
+		self.cohorts = dict()	#id(group) -> Cohort
+		self.groups = dict()	#id(group) -> group, so the ids stay in use
+
+
+
+	def __len__(self):
+		return len(self.cohorts)
+
+
+
+	def sums(self, group, lexicon):
+		'''
+		(count, e1_sum, e2_sum, length_sum) arrays for group,
+		indexed like word_ids (set from lexicon).
+		Cached; only use this for groups that have stopped listening
+		'''
+		self.set_lexicon(lexicon)
+		key = id(group)
+		co = self.cohorts.get(key)
+		edits = sum([a.edits for a in group])
+		if (co is not None and co.edits == edits and co.size == len(group) and co.word_ids == self.word_ids):
+			return co.sums
+		co = Cohort(len(group), self.word_ids, self.scan([group]), edits)
+		self.cohorts[key] = co
+		self.groups[key] = group
+		return co.sums
+
+
+
+	def scan(self, groups):
+		'''
+		(count, e1_sum, e2_sum, length_sum) arrays over the agents of groups, indexed like word_ids,
+		summed straight from their idiolects in agent order. Words missing from the lexicon are skipped
+		'''
+		wi = self.word_index
+		sums = zero_sums(len(self.word_ids))
+		(count, e1_sum, e2_sum, l_sum) = sums
+		for g in groups:
+			for a in g:
+				for (w_id, w) in a.idio.items():
+					j = wi.get(w_id)
+					if j is None:
+						continue
+					p = w.percept
+					count[j] += 1
+					e1_sum[j] += p.e1
+					e2_sum[j] += p.e2
+					l_sum[j] += p.length
+		return sums
+
+
+
+	def drop(self, group):
+		'''Forget a group (charon removed it)'''
+		key = id(group)
+		if self.cohorts.pop(key, None) is not None:
+			del self.groups[key]
+
+
+
+def add_sums(total, sums):
+	'''Add one group's sums into total (same word order)'''
+	for (t, s) in zip(total, sums):
+		for i in range(len(s)):
+			t[i] += s[i]
+
+
+
+def zero_sums(n):
+	'''Empty (count, e1_sum, e2_sum, length_sum) for n words'''
+	return (array('l', bytes(n * array('l').itemsize)), array('d', bytes(n * 8)),
+			array('d', bytes(n * 8)), array('d', bytes(n * 8)))
@@ -0,0 +1,242 @@
+'''
+Uniform grid over ERB space (e1, e2) for an Agent's repertoire.
+Answers "phones within r of a point" and "nearest phone"
+by only looking at nearby cells instead of the whole repertoire.
+
+Every phone is stamped with an insertion number,
+and query results come back in that order,
+which is the order of the repertoire list.
+The matchers break ties by repertoire order,
+so they pick the same phone with or without the grid.
+
+Within a cell, phones are also bucketed by length,
+so matchers that only accept phones of a compatible length
+(Agent.length_matcher, see length_window) skip the other buckets.
+
+The grid mirrors the list; the Agent calls add/remove/move
+wherever it changes the repertoire or moves a phone.
+'''
+
+from math import floor
+
+MIN_CELL = .25	#smallest cell side in ERB (perception may be 0)
+LENGTH_CELL = 25	#length bucket size in ms
+
+
+
+def length_window(length):
+	'''
+	(shortest, longest) phone length Agent.length_matcher can accept
+	for a signal of this length (within 50% of the phone's length),
+	with a little slack for rounding
+	'''
+	return (length / 1.5 - 1, length * 2 + 1)
+
+
+
+def bucket(length):
+	return int(floor(length / LENGTH_CELL))
+
+class PhoneGrid:
+
+	def __init__(self, rep, cell = 1.0):
+		'''
+		rep is the repertoire (list of Vowels) to index,
+		cell is the side of a grid cell in ERB, normally the agent's perception
+		'''
+		self.rep = rep
+		self.cell = max([MIN_CELL, cell])
+		self.rebuild()
+
+
+
+	def rebuild(self):
+		'''Index every phone of self.rep, numbering them in list order'''
+		self.cells = dict()		#(i, j) -> {length bucket: list of Vowels}
+		self.where = dict()		#id(Vowel) -> [(i, j, length bucket), insertion number]
+		self.seq = 0
+		#bounding box of the cells ever used, to stop nearest() searching
+		self.lo_i = self.lo_j = None
+		self.hi_i = self.hi_j = None
+		for v in self.rep:
+			self.add(v)
+
+
+
+	def __len__(self):
+		return len(self.where)
+
+
+
+	def __getstate__(self):
+		#ids are only good within one process; re-index on unpickling
+		return (self.rep, self.cell)
+
+
+
+	def __setstate__(self, state):
+		(rep, cell) = state
+		self.rep = rep
+		self.cell = cell
+		self.rebuild()
+
+
+
+	def key(self, e1, e2):
+		c = self.cell
+		return ( int(floor(e1 / c)), int(floor(e2 / c)) )
+
+
+
+	def add(self, v):
+		k = self.key(v.e1, v.e2)
+		b = bucket(v.length)
+		self.cells.setdefault(k, dict()).setdefault(b, []).append(v)
+		self.where[id(v)] = [k + (b,), self.seq]
+		self.seq += 1
+		(i, j) = k
+		if self.lo_i is None:
+			self.lo_i = self.hi_i = i
+			self.lo_j = self.hi_j = j
+		else:
+			self.lo_i = min([self.lo_i, i])
+			self.hi_i = max([self.hi_i, i])
+			self.lo_j = min([self.lo_j, j])
+			self.hi_j = max([self.hi_j, j])
+
+
+
+	def remove(self, v):
+		spot = self.where.pop(id(v), None)
+		if spot is None:
+			return
+		(i, j, b) = spot[0]
+		buckets = self.cells[(i, j)]
+		cell = buckets[b]
+		for n in range(len(cell)):
+			if cell[n] is v:
+				del cell[n]
+				break
+		if not cell:
+			del buckets[b]
+			if not buckets:
+				del self.cells[(i, j)]
+
+
+
+	def move(self, v):
+		'''Re-file v after its formants or length changed. It keeps its place in the order'''
+		spot = self.where.get(id(v))
+		if spot is None:
+			return
+		seq = spot[1]
+		self.remove(v)
+		self.add(v)
+		self.seq -= 1
+		self.where[id(v)][1] = seq
+
+
+
+	def order(self, v):
+		return self.where[id(v)][1]
+
+
+
+	def near(self, e1, e2, r, lengths = None):
+		'''
+		Phones in the cells touching the square of half-side r around (e1, e2),
+		in repertoire order. This is a superset of the phones within r;
+		callers still apply their own distance test.
+		lengths is (shortest, longest) to only look in those length buckets
+		(e.g. length_window); callers still apply their own length test too.
+		'''
+		if r < 0 or not self.cells:
+			return []
+		(i0, j0) = self.key(e1 - r, e2 - r)
+		(i1, j1) = self.key(e1 + r, e2 + r)
+		cells = self.cells
+		found = []
+		if (i1 - i0 + 1) * (j1 - j0 + 1) > len(cells):
+			#big radius: cheaper to walk the occupied cells
+			spots = ( buckets for ((i, j), buckets) in cells.items() if i0 <= i <= i1 and j0 <= j <= j1 )
+		else:
+			spots = ( cells.get((i, j)) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) )
+		if lengths is None:
+			for buckets in spots:
+				if buckets:
+					for cell in buckets.values():
+						found.extend(cell)
+		else:
+			b0 = bucket(lengths[0])
+			b1 = bucket(lengths[1])
+			for buckets in spots:
+				if buckets:
+					for (b, cell) in buckets.items():
+						if b0 <= b <= b1:
+							found.extend(cell)
+		if len(found) > 1:
+			w = self.where
+			found.sort(key = lambda v: w[id(v)][1])
+		return found
+
+
+
+	def nearest(self, e1, e2, test = None, lengths = None):
+		'''
+		Closest phone to (e1, e2) passing test (a function of a Vowel, or None).
+		lengths is (shortest, longest) to skip the other length buckets, as in near.
+		Ties go to the phone later in the repertoire, like Agent.rec_vowel_match.
+		Returns (Vowel, distance) or None if nothing passes.
+		'''
+		if not self.cells:
+			return None
+		if lengths is None:
+			(b0, b1) = (None, None)
+		else:
+			b0 = bucket(lengths[0])
+			b1 = bucket(lengths[1])
+		(ci, cj) = self.key(e1, e2)
+		c = self.cell
+		w = self.where
+		best = None
+		best_d = None
+		best_seq = -1
+		#rings of cells around the query point, until nothing outside can be closer
+		reach = max([abs(ci - self.lo_i), abs(ci - self.hi_i), abs(cj - self.lo_j), abs(cj - self.hi_j)])
+		k = 0
+		while k <= reach:
+			if best is not None and best_d < (k - 1) * c:
+				break
+			for (i, j) in ring(ci, cj, k):
+				buckets = self.cells.get((i, j))
+				if not buckets:
+					continue
+				for (b, cell) in buckets.items():
+					if (b0 is not None and not (b0 <= b <= b1)):
+						continue
+					for v in cell:
+						if test and not test(v):
+							continue
+						e1_dif = (e1 - v.e1)
+						e2_dif = (e2 - v.e2)
+						d = ((e1_dif * e1_dif) + (e2_dif * e2_dif))**.5
+						if best is None or d < best_d or (d == best_d and w[id(v)][1] > best_seq):
+							best = v
+							best_d = d
+							best_seq = w[id(v)][1]
+			k += 1
+		if best is None:
+			return None
+		return (best, best_d)
+
+
+
+def ring(ci, cj, k):
+	'''Cells at Chebyshev distance exactly k from cell (ci, cj)'''
+	if k == 0:
+		return [(ci, cj)]
+	cells = [(ci - k, j) for j in range(cj - k, cj + k + 1)]
+	cells.extend([(ci + k, j) for j in range(cj - k, cj + k + 1)])
+	cells.extend([(i, cj - k) for i in range(ci - k + 1, ci + k)])
+	cells.extend([(i, cj + k) for i in range(ci - k + 1, ci + k)])
+	return cells
@@ -36,7 +36,6 @@ more succinctly FIIK;WMTU."
 
 import Agent, Convention, Vowel
 from time import ctime
-from graphics import *
 import re
 from random import sample, choice, uniform, randint
 
@@ -654,9 +653,19 @@ def articulations():
 
 	
 
+_feature_dicts = dict()	#language -> feature matrix, built once
+
 def get_feature_dict(language = "english"):
+	'''
+	The consonant feature matrix for a language.
+	Each matrix is built on the first call and shared after that,
+	so don't modify the returned dict or its lists.
+	'''
 	lang = language.lower()
 	
+	if lang in _feature_dicts:
+		return _feature_dicts[lang]
+	
 	languages = {"english": english}
 	
 	if lang not in languages:
@@ -664,7 +673,52 @@ def get_feature_dict(language = "english"):
 		return
 	
 
-	return languages[lang]()
+	fd = languages[lang]()
+	_feature_dicts[lang] = fd
+	return fd
+
+
+
+
+
+#COMPILED COARTICULATION
+#The feature methods keep no state, so one Phonology instance serves everyone.
+#A chain is the tuple of its methods for a list of features,
+#built the first time that list is seen (i.e. once per consonant and active features).
+_shared = None
+_chains = dict()
+
+def shared():
+	'''The Phonology instance whose articulations the chains use'''
+	global _shared
+	if _shared is None:
+		_shared = Phonology()
+	return _shared
+
+
+
+def chain(features):
+	'''Tuple of articulation methods for features, in order'''
+	key = tuple(features)
+	fns = _chains.get(key)
+	if fns is None:
+		arts = shared().articulations
+		fns = tuple(arts[f] for f in key)
+		_chains[key] = fns
+	return fns
+
+
+
+def apply_chain(fns, syll, pos, assim):
+	'''
+	Run the nucleus of syll (onset, nucleus, coda) through a chain.
+	pos is 0 (onset), 1 (nucleus) or 2 (coda); assim is True to coarticulate
+	and False to undo it. Returns the modified nucleus
+	'''
+	(o, n, c) = syll
+	for fn in fns:
+		n = fn( (o, n, c), pos, assim)
+	return n
 
 
 
@@ -11,6 +11,7 @@ class Prototype(Vowel.Vowel):
     and the number of carriers (Agents)
     i.e. the conventional representation of a vowel for some population.
     Prototypes are formed by collecting Vowels from agents. '''
+    __slots__ = ("carriers",)
     
     def __init__(self, e1, e2, length, name):
         super(Prototype, self).__init__(e1, e2, length, name)
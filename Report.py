@@ -0,0 +1,122 @@
+'''
+Text report of a game, written to a file as the game runs.
+
+Game_fns report functions (proto_report, find_sound_changes, count_word_vowels,
+print_all_reps, count_near_splits) hand each section to Game_fns.add_report.
+With no report_path set, sections are held in Game_fns.str_buf until write_report;
+with one, they go through a Sink to the file when they are made,
+so nothing builds up however long the run is.
+
+FILES
+	path				one file, appended to (path.gz if compressed)
+	path_00000.txt, path_00001.txt, ...
+						parts, when max_bytes is set: a new part is started
+						once the current one reaches max_bytes (the suffix is path's own,
+						.txt if it has none; .gz is added if compressed)
+Every file starts with the header (the game settings, see Game_fns.report_header),
+and sections are separated by newlines, as write_report lays them out.
+A compressed file that is appended to gets one more gzip member, which gzip/zcat read as one.
+A Sink opened where there are already parts carries on numbering after them.
+'''
+
+import os, gzip
+
+class Sink:
+
+	def __init__(self, path, max_bytes = 0, compress = False):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.compress = compress
+		(stem, ext) = os.path.splitext(path)
+		self.stem = stem
+		self.ext = ext or ".txt"
+		if compress:
+			self.ext += ".gz"
+		self.part = len(parts(path, compress))
+		self.f = None
+		self.raw = None
+		self.empty = True		#nothing written to the open file yet
+
+
+
+	def file_name(self):
+		'''The file sections are going to'''
+		if not self.max_bytes:
+			return self.path + (".gz" if self.compress else "")
+		return "{0}_{1:05d}{2}".format(self.stem, self.part, self.ext)
+
+
+
+	def is_open(self):
+		return self.f is not None
+
+
+
+	def open(self, header = ""):
+		'''Start the next file with header (the caller builds it once per file)'''
+		fn = self.file_name()
+		d = os.path.dirname(fn)
+		if d:
+			os.makedirs(d, exist_ok = True)
+		self.raw = open(fn, "ab")
+		if self.compress:
+			self.f = gzip.GzipFile(fileobj = self.raw, mode = "ab")
+		else:
+			self.f = self.raw
+		self.empty = True
+		if header:
+			self.put(header)
+
+
+
+	def size(self):
+		'''Bytes in the open file so far (compressed data still buffered is not counted)'''
+		return self.raw.tell()
+
+
+
+	def put(self, s):
+		if not self.empty:
+			s = "\n" + s
+		self.f.write(s.encode("utf-8"))
+		self.empty = False
+
+
+
+	def write(self, s):
+		'''Add one section'''
+		if self.f is None:
+			self.open()
+		self.put(s)
+		if not self.compress:
+			self.f.flush()
+		if (self.max_bytes and self.size() >= self.max_bytes):
+			self.close()
+
+
+
+	def close(self):
+		'''Finish the open file; the next section opens another (the next part, if there are parts)'''
+		if self.f is None:
+			return
+		if self.compress:
+			self.f.close()
+		self.raw.close()
+		self.f = None
+		self.raw = None
+		if self.max_bytes:
+			self.part += 1
+
+
+
+def parts(path, compress = False):
+	'''A report's part files, in order'''
+	(stem, ext) = os.path.splitext(path)
+	ext = (ext or ".txt") + (".gz" if compress else "")
+	d = os.path.dirname(stem) or "."
+	base = os.path.basename(stem) + "_"
+	if not os.path.isdir(d):
+		return []
+	found = [fn for fn in os.listdir(d) if (fn.startswith(base) and fn.endswith(ext)
+											and fn[len(base):-len(ext)].isdigit())]
+	return [os.path.join(d, fn) for fn in sorted(found)]
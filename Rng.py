@@ -0,0 +1,32 @@
+'''
+Seeded random streams for reproducible games.
+
+Every module draws from the random module's shared generator
+(Phonology, Word, Agent, Convention and Game_fns import its functions),
+so instead of threading a generator object through every call
+a seeded game reseeds the shared generator at fixed points.
+Each point gets its own stream, derived from the game seed and a key
+such as (step, agent name). A learner's draws therefore don't depend on
+how many draws came before it, or on which process it runs in.
+
+The seed only picks the streams; a seeded game follows the same rules as an unseeded one.
+An unseeded game never calls reseed and draws exactly as before.
+'''
+
+import random, hashlib
+
+def derive(seed, *key):
+	'''
+	128-bit seed for the stream named by key.
+	Uses a hash of the repr so it is the same in every process
+	(str hashing is randomized per interpreter).
+	'''
+	h = hashlib.blake2b(repr((seed,) + key).encode(), digest_size = 16)
+	return int.from_bytes(h.digest(), "big")
+
+
+
+def reseed(seed, *key):
+	'''Switch the shared generator to the stream for (seed, key)'''
+	random.seed(derive(seed, *key))
+
@@ -0,0 +1,83 @@
+'''
+The speakers of one step, for Game_fns.diffuse.
+
+Speakers are numbered in population order;
+each one's words are held as a tuple (idiolect order),
+so picking speakers and words is drawing indexes,
+with no lists built per learner.
+
+A speaker's tuple is rebuilt if their vocabulary has grown since it was made
+(a learner who also speaks picks up new words during the step),
+unless the speaker was frozen (see freeze).
+
+Pickled (for Game_fns.diffuse_parallel), a Speakers keeps only the tuples,
+with each word cut down to what is needed to say it (Word.spoken),
+so every speaker comes out frozen.
+'''
+
+from random import sample
+
+class Speakers:
+
+	def __init__(self, agents):
+		self.agents = agents
+		self.names = [a.name for a in agents]
+		self.index = dict( (name, i) for (i, name) in enumerate(self.names) )
+		self.words = [tuple(a.idio.values()) for a in agents]
+		self.live = [True] * len(agents)	#False once frozen
+
+
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state["agents"] = None
+		state["words"] = [tuple(w.spoken() for w in ws) for ws in self.words]
+		state["live"] = [False] * len(self.names)
+		return state
+
+
+
+	def __len__(self):
+		return len(self.names)
+
+
+
+	def __contains__(self, name):
+		return name in self.index
+
+
+
+	def words_of(self, i):
+		'''Speaker i's words, as a tuple'''
+		ws = self.words[i]
+		if self.live[i]:
+			idio = self.agents[i].idio
+			if len(idio) != len(ws):
+				ws = self.words[i] = tuple(idio.values())
+		return ws
+
+
+
+	def sample_words(self, i, lim = 0):
+		'''lim random words of speaker i (0 for all of them)'''
+		ws = self.words_of(i)
+		if (lim and ws):
+			return sample(ws, lim)
+		return ws
+
+
+
+	def freeze(self, learners):
+		'''
+		Learners (who are also speakers) speak from copies of their words,
+		so updates they make during the step aren't heard until the next step
+		'''
+		index = self.index
+		for a in learners:
+			i = index.get(a.name)
+			if i is not None:
+				#even an empty vocabulary, which would fill up as the learner hears words
+				self.words[i] = tuple(w.copy() for w in a.idio.values())
+				self.live[i] = False
+		return self
+
@@ -5,6 +5,22 @@ Last update March 2016 HJMS'''
 
 import random #used for generating formants 
 
+#feature tuples are interned, so every vowel with the same features shares one tuple
+_feature_tuples = dict()
+
+def intern_features(features):
+	'''The shared tuple for a list/tuple of feature names'''
+	key = tuple(features)
+	return _feature_tuples.setdefault(key, key)
+
+NO_FEATURES = intern_features(())
+
+#bits of Vowel.flags
+NASAL, ROUNDED, RETRACTED = (1, 2, 4)
+
+#what a Vowel is, without its (passing) neighbors list, see fields
+FIELDS = ("e1", "e2", "length", "name", "weight", "features", "flags")
+
 class Vowel:
 	'''Vowel class -- 
 	Represented by tuple: Vowel(f1_hz, f2_hz, length, weight)
@@ -21,7 +37,13 @@ class Vowel:
 	Weight is functional load where zero is weakest.
 	Weight is determined by the number of words "using" a vowel for an Agent.
 	If no weight is set, it will default to zero.
+
+	Vowels are made constantly (every utterance, every imitation),
+	so they use __slots__ instead of a __dict__:
+	the three feature flags share one int, features is an interned tuple,
+	and the neighbors list is only made when it is used.
 	'''
+	__slots__ = ("e1", "e2", "length", "name", "weight", "features", "flags", "_neighbors")
 
 	def __init__(self, e1, e2, length, name, weight = 0):
 		self.e1 = e1	#ERB first formant (lip rounding e.g. high/low)
@@ -34,14 +56,40 @@ class Vowel:
 		#FEATURES
 		#####NOTE TO LINGUISTS...
 		######Please don't misconstrue this as an implementation of binary features
-		self.nasal = False
-		self.rounded = False
-		self.retracted = False
-		self.features = []
-		self.neighbors = []	 #neighbors are Agent's other Vowels within some margin (see Agent.py)
+		self.flags = 0		#nasal, rounded, retracted (see the properties below)
+		self.features = NO_FEATURES
+		self._neighbors = None	 #neighbors are Agent's other Vowels within some margin (see Agent.py)
 		
 
 
+	@property
+	def neighbors(self):
+		n = self._neighbors
+		if n is None:
+			n = self._neighbors = []
+		return n
+
+	@neighbors.setter
+	def neighbors(self, n):
+		self._neighbors = n
+
+
+
+	def get_flag(self, bit):
+		return bool(self.flags & bit)
+
+	def set_flag(self, bit, on):
+		if on:
+			self.flags |= bit
+		else:
+			self.flags &= ~bit
+
+	nasal = property(lambda self: self.get_flag(NASAL), lambda self, on: self.set_flag(NASAL, on))
+	rounded = property(lambda self: self.get_flag(ROUNDED), lambda self, on: self.set_flag(ROUNDED, on))
+	retracted = property(lambda self: self.get_flag(RETRACTED), lambda self, on: self.set_flag(RETRACTED, on))
+
+
+
 	def erb_tuple(self):
 		'''returns a tuple of (e1, e2) i.e. (float, float)''' 
 		return (self.e1, self.e2)
@@ -66,6 +114,19 @@ class Vowel:
 		nv.weight = self.weight
 		return nv
 
+
+
+	def fields(self):
+		'''The values of FIELDS, as a tuple (see Agent.lesson)'''
+		return (self.e1, self.e2, self.length, self.name, self.weight, self.features, self.flags)
+
+
+
+	def set_fields(self, fields):
+		'''Put back values from fields()'''
+		(self.e1, self.e2, self.length, self.name, self.weight, features, self.flags) = fields
+		self.features = intern_features(features)
+
 	
 	
 	def euc(self, v):
@@ -162,7 +223,7 @@ class Vowel:
 		else:
 			fl.append("mid")
 			
-		self.features = fl
+		self.features = intern_features(fl)
 		
 
 
@@ -2,6 +2,7 @@
 Run with Convention, Prototype, Game_fns, im_game, Agent, Phonology
 Last update February 2017 HJMS'''
 import Agent, Phonology, Vowel, Segment
+from collections import OrderedDict
 max_e1 = Agent.e1_max()
 min_e1 = Agent.e1_min()
 max_e2 = Agent.e2_max()
@@ -27,6 +28,7 @@ class Word():
 		
 		tag = "'[{0}][{1}][{2}]'".format(onset, nucleus, coda)
 		self.id = tag
+		self.key = -1		#index in the lexicon (see Convention.number_lexicon), -1 if not numbered
 		self.count = 0
 		
 		self.noise = pn
@@ -37,14 +39,16 @@ class Word():
 		
 		self.morphs = True	#morphological alternations
 
+		#vowel history: id(Vowel) -> (Vowel, count), the leader (percept's entry) first
+		#see add_hist; read it in order with history()
+		self.vowel_hist = OrderedDict()
 		if percept:
 			self.fixed = True #adults' words are fixed
-			self.vowel_hist = [(percept, 1)]
+			self.vowel_hist[id(percept)] = (percept, 1)
 			self.percept = percept
 			self.vowel = percept
 		else:
 			self.fixed = False
-			self.vowel_hist = []
 			self.percept = None
 			self.vowel = None
 			
@@ -67,6 +71,41 @@ class Word():
 		
 		
 
+	def copy(self):
+		'''Shallow copy with its own history (the Vowels are shared)'''
+		w = Word(self.onset, self.nucleus, self.coda, None, self.noise)
+		w.__dict__.update(self.__dict__)
+		w.vowel_hist = OrderedDict(self.vowel_hist)
+		return w
+
+
+
+	def spoken(self):
+		'''Copy with only what a speaker needs to say the word (no history), see Speakers.__getstate__'''
+		w = Word(self.onset, self.nucleus, self.coda, None, self.noise)
+		w.__dict__.update(self.__dict__)
+		w.vowel_hist = OrderedDict()
+		w.vowel = None
+		return w
+
+
+
+	def __getstate__(self):
+		#the history is keyed by id(), which is only good within one process
+		state = self.__dict__.copy()
+		state["vowel_hist"] = self.history()
+		return state
+
+
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.set_history(state["vowel_hist"])
+
+
+
+
+
 	def set_percept(self, percept):
 		self.percept = percept
 		
@@ -85,11 +124,11 @@ class Word():
 		'''
 		applies random noise
 		then assimilation
-		
 		'''
 		from random import uniform, randint
 		fm = phon_fd
-		P = Phonology.Phonology
+		ac = Phonology.apply_chain
+		chain = Phonology.chain
 		onset = self.onset.name
 		nuc = self.percept
 		coda = self.coda.name
@@ -142,11 +181,7 @@ class Word():
 		
 		#APPLY COARTICULATION TRANSFORMS
 		
-		c1 = P(fm[onset])
-		c2 = P(fm[coda])
 		nfl = n_nuc.features
-		ofl = c1.features
-		cfl = c2.features
 		
 		#simulated morphological alternations
 		#chance of a feature being "left off" due to context/use (inflectional/derivational)
@@ -154,21 +189,13 @@ class Word():
 		morph_chance = 50
 		
 		#onset transformations (coart)
-		for of in ofl:
-			ofns = c1.articulations
-			of_nuc = ofns[of]((onset, n_nuc, coda), 0, True)
-			n_nuc = of_nuc
+		n_nuc = ac(chain(fm[onset]), (onset, n_nuc, coda), 0, True)
 		
 		#nucleus production noise (art)
-		for nf in nfl:
-			nf_nuc = ofns[nf]((onset, n_nuc, coda), 1, True)
-			n_nuc = nf_nuc
+		n_nuc = ac(chain(nfl), (onset, n_nuc, coda), 1, True)
 		
 		#coda transformations (coart)
-		for cf in cfl:
-			cfns = c2.articulations
-			cf_nuc = cfns[cf]( (onset, n_nuc, coda), 2, True)
-			n_nuc = cf_nuc
+		n_nuc = ac(chain(fm[coda]), (onset, n_nuc, coda), 2, True)
 			
 		return n_nuc
 		
@@ -176,25 +203,24 @@ class Word():
 		
 		
 		
-	def get_form(self):
+	def form_mask(self):
+		'''
+		Draw a simulated morphological alternation:
+		chance of a feature being "left off" due to context/use (inflectional/derivational).
+		Returns an int with a bit set for each feature that is kept, onset features in the low bits.
+		get_vowel looks the coarticulation transforms up by consonant name,
+		so the alternation doesn't move the vowel; speakers still draw one per token,
+		as they did when it was built as a Word, so seeded runs are unchanged
+		'''
 		from random import randint
-		#simulated morphological alternations
-		#chance of a feature being "left off" due to context/use (inflectional/derivational)
-		#morphable_features = ["stop", "voiced", "fricative", "spread"] 
-		onset = self.onset
-		nuc = self.nucleus
-		coda = self.coda
-		
 		morph_chance = 75 # 75% chance for each feature to be included
 
-		ofl = [f for f in onset.features if ((randint(0, 99) < morph_chance) or f is "null")]
-		cfl = [f for f in coda.features if ((randint(0, 99) < morph_chance)  or f is "null")]		
-		onset_cc = Segment.Segment(onset.name, ofl, onset.symbol)
-		coda_cc = Segment.Segment(coda.name, cfl, coda.symbol)
-		
-		form = Word(onset_cc, nuc, coda_cc, self.percept, self.noise)
-		
-		return form
+		mask = 0
+		fl = self.onset.features + self.coda.features
+		for (i, f) in enumerate(fl):
+			if ((randint(0, 99) < morph_chance) or f == "null"):
+				mask |= 1 << i
+		return mask
 
 
 
@@ -215,25 +241,17 @@ class Word():
 
 		returns the modified vowel
 		'''
-		P = Phonology.Phonology
 		fm = Phonology.get_feature_dict() #consonant compensation methods (feature matrix)
+		ac = Phonology.apply_chain
+		chain = Phonology.chain
 		
 		onset = self.onset
 		nucleus = self.percept
 		coda = self.coda
 		
 		nuc = nucleus.cc()
-		c1 = P(fm[onset])
-		c2 = P(fm[coda])
-		ofl = c1.features
-		cfl = c2.features
-
-		for of in ofl:
-			ofns = c1.articulations
-			nucleus = ofns[of]((onset, nuc, coda), 0, True)
-		for cf in cfl:
-			cfns = c2.articulations
-			nucleus = cfns[cf]( (onset, nuc, coda), 2, True)
+		nucleus = ac(chain(fm[onset]), (onset, nuc, coda), 0, True)
+		nucleus = ac(chain(fm[coda]), (onset, nucleus, coda), 2, True)
 			
 		return nucleus
 		
@@ -325,24 +343,26 @@ class Word():
 		   otherwise, add it to the end of history list.
 		'''
 
-		v_ind = self.vowel_record_i(v)
-		if (v_ind is None):
-			self.vowel_hist.append( (v, 1) )
+		vh = self.vowel_hist
+		k = id(v)
+		rec = vh.pop(k, None)
+		if (rec is None):
+			vh[k] = (v, 1)
 			if not self.percept:
 				self.set_percept(v)
 		else:
-			p, c = self.vowel_hist.pop(v_ind)
-			counts = c+1
+			counts = rec[1]+1
 			
-			if (not self.vowel_hist):
-				self.vowel_hist.append( (v, counts) )
+			if (not vh):
+				vh[k] = (v, counts)
 				self.set_percept(v)
-			elif (counts > self.vowel_hist[0][1] ):
-				self.vowel_hist.insert(0, (v, counts) )
+			elif (counts > self.leader()[1] ):
+				vh[k] = (v, counts)
+				vh.move_to_end(k, False)
 				self.set_percept(v)
 				#print(v, "assigned to", self.id)
 			else:
-				self.vowel_hist.append( (v, counts) )
+				vh[k] = (v, counts)
 
 
 
@@ -355,23 +375,50 @@ class Word():
 		True if the agent has matched this vowel to word (self) before
 		False if vowel has no entry in history
 		'''
-		
-		for (p, c) in self.vowel_hist:
-			if p is v:
-				return True
-		return False
+		return id(v) in self.vowel_hist
 
 
 
 
 
 	
-	def vowel_record_i(self, v):
-		for i in range(len(self.vowel_hist)):
-			p, c = self.vowel_hist[i]
-			if v is p:
-				return i
-		return None
+	def history(self):
+		'''The history as a list of (Vowel, count), the leader first'''
+		return list(self.vowel_hist.values())
+
+
+
+
+
+	def set_history(self, pairs):
+		'''Replace the history with pairs, a list of (Vowel, count) in order'''
+		self.vowel_hist = OrderedDict( (id(v), (v, c)) for (v, c) in pairs )
+
+
+
+
+
+	def leader(self):
+		'''(Vowel, count) at the front of the history'''
+		return next(iter(self.vowel_hist.values()))
+
+
+
+
+
+	def push_record(self, v, counts):
+		'''
+		File (v, counts) as a new entry:
+		at the front if it beats the leader (or the history is empty), otherwise at the back.
+		Returns True if v went to the front
+		'''
+		vh = self.vowel_hist
+		k = id(v)
+		front = ( (not vh) or counts > self.leader()[1] )
+		vh[k] = (v, counts)
+		if front:
+			vh.move_to_end(k, False)
+		return front
 	
 	
 	
@@ -385,28 +432,20 @@ class Word():
 		one vowel has absorbed the other in agent rep.
 		Move the words to the stronger vowel.
 		'''
-		sv_vci = self.vowel_record_i(sv)
-
-		if (sv_vci is not None):
-			sv_copy, sv_counts = self.vowel_hist.pop(sv_vci)
-		else:
-			sv_copy, sv_counts = sv, 0
+		vh = self.vowel_hist
+		sv_copy, sv_counts = vh.pop(id(sv), (sv, 0))
 			
-		wv_vci = self.vowel_record_i(wv)
-		if (wv_vci is not None):
-			wv_copy, wv_counts = self.vowel_hist.pop(wv_vci)
+		wv_rec = vh.pop(id(wv), None)
+		if (wv_rec is not None):
+			wv_copy, wv_counts = wv_rec
 			
 			new_sv_counts = sv_counts + wv_counts
-			if ( len(self.vowel_hist) is 0 or
-				 new_sv_counts > self.vowel_hist[0][1]):
-				self.vowel_hist.insert(0, (sv_copy, new_sv_counts))
+			if self.push_record(sv_copy, new_sv_counts):
 				self.set_percept(sv_copy)
-			else:
-				self.vowel_hist.append((sv_copy, new_sv_counts))
 
 		else:	#something has gone wrong
 			print("error report:", wv, "not in history:")
-			for v, c in self.vowel_hist:
+			for v, c in self.history():
 				print(v, c)
 				
 				
@@ -419,13 +458,13 @@ class Word():
 		Move the words to the stronger vowel.
 		'''
 
-		counts = 0
-		if ( (wv in self.vowel_hist) and
-			 (sv in self.vowel_hist) and
+		vh = self.vowel_hist
+		if ( self.has_record(wv) and
+			 self.has_record(sv) and
 			 (wv is not sv)):
-			counts = self.vowel_hist[wv]
-			self.vowel_hist[sv] += counts
-			self.vowel_hist[wv] = 0
+			counts = vh[id(wv)][1]
+			vh[id(sv)] = (sv, vh[id(sv)][1] + counts)
+			vh[id(wv)] = (wv, 0)
 
 
 
@@ -440,23 +479,11 @@ class Word():
 		and update mv's weight to ( v1's weight + v2's weight )
 		'''
 
-		v1_vci = self.vowel_record_i(v1)	#get v1 frequency count (0 if no entry)
-		if (v1_vci is not None):
-			v1_copy, v1_counts = self.vowel_hist.pop(v1_vci)
-		else:
-			v1_copy, v1_counts = v1, 0
-
-		v2_vci = self.vowel_record_i(v2)	#get v2 frequency count (0 if no entry)
-		if (v2_vci is not None):
-			v2_copy, v2_counts = self.vowel_hist.pop(v2_vci)
-		else:
-			v2_copy, v2_counts = v2, 0
+		vh = self.vowel_hist
+		v1_copy, v1_counts = vh.pop(id(v1), (v1, 0))	#get v1 frequency count (0 if no entry)
+		v2_copy, v2_counts = vh.pop(id(v2), (v2, 0))	#get v2 frequency count (0 if no entry)
 			
 		counts = v1_counts + v2_counts
 		
-		if ( (not self.vowel_hist) or
-			 counts > self.vowel_hist[0][1]):
-			self.vowel_hist.insert(0, (mv, counts))
+		if self.push_record(mv, counts):
 			self.set_percept(mv)
-		else:
-			self.vowel_hist.append( (mv, counts) )
@@ -0,0 +1,274 @@
+'''
+Headless batch runner for VoSS.
+Runs games from a parameter file with no menu, prompts or plotting,
+and writes the results as JSON.
+
+USAGE
+$python3 batch_game.py params.json [-o results.json] [--seed N] [--resume DIR]
+(.toml parameter files work too)
+
+PARAMETER FILES
+Keys are the Game_fns attributes set in Game_fns.__init__ / my_presets, e.g.
+	{
+	 "seed": 7,
+	 "language": "spanish",
+	 "num_cycles": 2,
+	 "perception": 1.0,
+	 "prox": -1,
+	 "anc_group_size": 60,
+	 "find_prototypes": "percept_protos"
+	}
+"language" is a name from Game_fns.set_languages (or set "base" to a prototype string).
+Attributes that hold methods (find_prototypes, sample_report) take a method name.
+"max_steps" stops a run early.
+"checkpoint_every": n saves the game to "checkpoint_path" every n steps;
+--resume DIR picks a single run up from that checkpoint instead of starting over
+(max_steps then counts the steps taken since the checkpoint).
+"metrics_path": dir records numbers from every step (or every "metrics_every" steps)
+in dir as they are made; see Metrics.py.
+A "runs" list of parameter dicts runs one game per entry,
+each entry overriding the top-level parameters.
+
+OUTPUT
+{"runs": [{"params", "prototypes", "displacement", "timing", "interactions", ...}]}
+Prototypes are the word prototypes with more than min_carrier_p of the population as carriers;
+displacement is measured in ERB from the IPA master set position of each prototype's vowel.
+'''
+
+import sys, json, time, argparse, contextlib, os
+import Game_fns, Convention
+
+#keys which are not Game_fns attributes
+EXTRA_KEYS = ("language", "max_steps", "runs", "seed")
+
+#settings which are derived from other settings in Game_fns
+DERIVED = ("age_adult", "max_groups", "g_size", "cycle_lim", "base", "lang_fn")
+
+
+
+def load_params(fn):
+	'''Read a .json or .toml parameter file into a dict'''
+	if fn.lower().endswith(".toml"):
+		import tomllib
+		with open(fn, "rb") as f:
+			return tomllib.load(f)
+	with open(fn) as f:
+		return json.load(f)
+
+
+
+def check_params(game, params):
+	'''
+	Raise ValueError for keys Game_fns doesn't have,
+	or values whose type doesn't match the default
+	'''
+	bad = []
+	for (k, v) in params.items():
+		if k in EXTRA_KEYS:
+			continue
+		if not hasattr(game, k):
+			bad.append("unknown parameter '{0}'".format(k))
+			continue
+		default = getattr(game, k)
+		if callable(default):
+			if not (isinstance(v, str) and callable(getattr(game, v, None))):
+				bad.append("'{0}' must name a Game_fns method".format(k))
+		elif isinstance(default, bool):
+			if not isinstance(v, bool):
+				bad.append("'{0}' must be true or false".format(k))
+		elif isinstance(default, (int, float)):
+			if isinstance(v, bool) or not isinstance(v, (int, float)):
+				bad.append("'{0}' must be a number".format(k))
+		elif isinstance(default, str) and not isinstance(v, str):
+			bad.append("'{0}' must be a string".format(k))
+	lang = params.get("language")
+	if lang is not None and lang not in game.languages:
+		bad.append("unknown language '{0}' (use one of {1})".format(lang, ", ".join(game.languages)))
+	if bad:
+		raise ValueError("; ".join(bad))
+
+
+
+def build_game(params):
+	'''A Game_fns set up from params, like the menu setters would leave it'''
+	game = Game_fns.Game_fns(params.get("seed"))
+	check_params(game, params)
+	for (k, v) in params.items():
+		if k in EXTRA_KEYS:
+			continue
+		if callable(getattr(game, k)):
+			v = getattr(game, v)
+		setattr(game, k, v)
+	game.show = False
+
+	lang = params.get("language")
+	if lang is not None:
+		game.lang_fn = lang
+		game.base = game.languages[lang]
+	elif "lang_fn" in params and "base" not in params:
+		game.base = game.languages[game.lang_fn]
+
+	#recompute what the setters would have
+	al = game.age_limit
+	if "age_limit" in params:
+		game.max_groups = al
+		if "age_adult" not in params:
+			game.age_adult = int(al/10) + 1
+	if "g_size" not in params:
+		game.g_size = max([2, int(game.anc_group_size * game.growth_rate)])
+	game.fam_size = min([game.fam_size, game.g_size])
+
+	c = Convention.Convention(False, game.color_on, game.lex_size)
+	c.str_to_protos(game.base)
+	game.convention = c
+	return game
+
+
+
+def run_game(game, max_steps = 0, resume = None):
+	'''
+	Play the game through num_cycles (or max_steps) without any reports.
+	resume is a checkpoint directory to carry on from.
+	Returns the number of steps taken
+	'''
+	if resume is None:
+		game.strap_game(True)
+		game.cycle_lim = game.num_cycles
+	else:
+		game.load_checkpoint(resume)
+		game.show = False
+	steps = 0
+	while (game.curr_cycle < game.cycle_lim and game.population_max > game.age_limit):
+		game.step()
+		steps += 1
+		if (max_steps and steps >= max_steps):
+			break
+	game.close_metrics()
+	game.close_workers()
+	return steps
+
+
+
+def get_results(game):
+	'''Prototypes and their displacement from the IPA master set, as dicts'''
+	if game.avg_adults_only:
+		min_age_avg = game.age_adult
+	else:
+		min_age_avg = 0
+	game.find_prototypes(min_age_avg, game.age_limit)
+
+	c = game.convention
+	mc = game.total_agents * game.min_carrier_p
+	ipa = c.ipa_dict
+	protos = []
+	classes = dict()
+	for p in sorted(c.proto_dict.values(), key = lambda p: p.name):
+		if p.carriers <= mc:
+			continue
+		vowel = c.nucleus_of(p.name)	#'[onset][vowel][coda]'
+		o = ipa.get(vowel)
+		entry = {"word": p.name, "vowel": vowel,
+				 "e1": p.e1, "e2": p.e2, "length": p.length,
+				 "carriers": p.carriers}
+		if o is not None:
+			entry["displacement"] = Convention.euc(p, o)
+			entry["d_e1"] = p.e1 - o.e1
+			entry["d_e2"] = p.e2 - o.e2
+			entry["d_length"] = p.length - o.length
+			classes.setdefault(vowel, []).append(entry)
+		protos.append(entry)
+
+	displacement = dict()
+	for (vowel, entries) in sorted(classes.items()):
+		n = len(entries)
+		displacement[vowel] = {"words": n,
+							   "mean_displacement": sum(e["displacement"] for e in entries) / n,
+							   "mean_d_e1": sum(e["d_e1"] for e in entries) / n,
+							   "mean_d_e2": sum(e["d_e2"] for e in entries) / n,
+							   "mean_d_length": sum(e["d_length"] for e in entries) / n}
+	return (protos, displacement)
+
+
+
+def run_params(params, resume = None):
+	'''Build, run and summarize one game. Game output goes to stderr'''
+	t0 = time.perf_counter()
+	with contextlib.redirect_stdout(sys.stderr):
+		game = build_game(params)
+		t1 = time.perf_counter()
+		steps = run_game(game, params.get("max_steps", 0), resume)
+		t2 = time.perf_counter()
+		protos, displacement = get_results(game)
+	t3 = time.perf_counter()
+	return {"params": params,
+			"language": game.lang_fn,
+			"base": game.base,
+			"cycles": game.curr_cycle,
+			"steps": steps,
+			"agents": game.total_agents,
+			"interactions": game.total_interactions,
+			"prototypes": protos,
+			"displacement": displacement,
+			"timing": {"setup_s": t1 - t0, "run_s": t2 - t1, "report_s": t3 - t2,
+					   "steps_per_s": (steps / (t2 - t1)) if t2 > t1 else None}}
+
+
+
+def expand_runs(params):
+	'''One parameter dict per run'''
+	runs = params.get("runs")
+	if not runs:
+		return [params]
+	shared = dict((k, v) for (k, v) in params.items() if k != "runs")
+	expanded = []
+	for r in runs:
+		p = dict(shared)
+		p.update(r)
+		expanded.append(p)
+	return expanded
+
+
+
+def main(argv = None):
+	ap = argparse.ArgumentParser(description = "Run VoSS games headless from a parameter file.")
+	ap.add_argument("params", help = "JSON or TOML parameter file")
+	ap.add_argument("-o", "--output", help = "results file (default: stdout)")
+	ap.add_argument("--seed", help = "seed for every run (overrides the file)")
+	ap.add_argument("--resume", help = "checkpoint directory to continue from")
+	args = ap.parse_args(argv)
+
+	params = load_params(args.params)
+	runs = expand_runs(params)
+	if (args.resume is not None and len(runs) > 1):
+		print("--resume needs a single run", file = sys.stderr)
+		return 2
+	if args.seed is not None:
+		seed = int(args.seed) if args.seed.lstrip("-").isdigit() else args.seed
+		for r in runs:
+			r["seed"] = seed
+
+	#every run's parameters are checked before any run starts
+	game = Game_fns.Game_fns()
+	for r in runs:
+		try:
+			check_params(game, r)
+		except ValueError as e:
+			print("Bad parameters:", e, file = sys.stderr)
+			return 2
+
+	results = {"params_file": os.path.abspath(args.params), "runs": []}
+	for r in runs:
+		results["runs"].append(run_params(r, args.resume))
+
+	out = json.dumps(results, indent = 1)
+	if args.output:
+		with open(args.output, "w") as f:
+			f.write(out)
+	else:
+		print(out)
+	return 0
+
+
+
+if __name__ == "__main__":
+	sys.exit(main())
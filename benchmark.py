@@ -0,0 +1,438 @@
+'''
+Benchmarks for the simulation hot paths.
+
+Every case is timed on a seeded game, so two runs of the same tree
+do the same work; compare trees (or commits) with a stored baseline.
+
+USAGE
+$python3 benchmark.py [--axis population|lexicon|repertoire|all] [--quick]
+                      [--save BASELINE.json] [--baseline BASELINE.json] [--tolerance .25]
+$python3 benchmark.py --check
+
+CASES
+	call_matchers_nh	a young learner hearing adults' words
+	dissimilate			Agent.dissimilate on the same tokens
+	get_vowel			Word.get_vowel over adults' idiolects
+	settle_conflicts	Agent.settle_conflicts on settled agents that just heard one token
+						(the incremental path; tokens are calls)
+	step				one Game_fns.step (tokens are interactions)
+	percept_protos		Game_fns.percept_protos for the adults
+	find_sound_changes	Game_fns.find_sound_changes
+
+CHECKS (--check)
+Shortcuts that must not change results, checked on the BASE game;
+each prints ok or FAILED, and the exit status is 1 if any failed.
+	checkpoint			save, load and step, against the same steps without the round trip
+	settle_conflicts	settle_conflicts against settle_conflicts_sweep on copies of every agent,
+						after rounds of random weight changes
+	diffuse_parallel	steps with 2 workers, against the same steps in one process with freeze_speakers
+
+AXES
+Each axis varies one setting, holding the others at BASE:
+	population	ancestor group size
+	lexicon		lexicon size
+	repertoire	vowel inventory size (language presets with 5 to 28 vowels)
+
+OUTPUT
+A table of tokens/sec and microseconds per token for each case and axis point
+(for step, ms per step). With --baseline, each case is compared to the stored
+time per token and marked SLOWER or FASTER past the tolerance;
+the exit status is 1 if anything got slower.
+'''
+
+import sys, io, time, json, copy, argparse, contextlib, tempfile, os
+from random import sample, uniform
+import Rng, Game_fns, batch_game
+
+SEED = 2024
+
+#settings every case starts from; the axes override one of them
+BASE = {"seed": SEED, "language": "spanish", "anc_group_size": 60, "lex_size": 25,
+		"age_limit": 20, "num_repeats": 4, "contact_agents": 10, "contact_words": 10}
+
+#language presets by inventory size
+REPERTOIRES = (("spanish", 5), ("english", 11), ("swedish", 20), ("danish", 28))
+
+AXES = {"population": ("anc_group_size", (30, 60, 120)),
+		"lexicon": ("lex_size", (12, 25, 50)),
+		"repertoire": ("language", tuple(lang for (lang, n) in REPERTOIRES))}
+
+WARMUP_STEPS = 4	#steps before timing, so there are learners, adults and conflicts
+MIN_TIME = .2		#seconds each case is repeated for (at least one round)
+CHECK_STEPS = 3		#steps run after a checkpoint round trip
+
+
+
+def quiet():
+	return contextlib.redirect_stdout(io.StringIO())
+
+
+
+def make_game(params):
+	'''A strapped game after WARMUP_STEPS steps'''
+	with quiet():
+		game = batch_game.build_game(params)
+		game.strap_game(True)
+		game.cycle_lim = game.num_cycles
+		for i in range(WARMUP_STEPS):
+			game.step()
+	return game
+
+
+
+def adults(game):
+	return [a for g in game.population for a in g if a.age >= game.age_adult and a.idio]
+
+
+
+def speaker_words(game):
+	'''Every word of every adult, in population order'''
+	return [w for a in adults(game) for w in a.idio.values()]
+
+
+
+def learner(game):
+	'''A copy of the youngest agent, so timing doesn't change the game'''
+	youngest = min((a for g in game.population for a in g), key = lambda a: a.age)
+	return copy.deepcopy(youngest)
+
+
+
+def timed(fn, setup = None, min_time = MIN_TIME):
+	'''
+	Repeat fn(state) until min_time has passed.
+	setup() makes a fresh state for each round (not timed).
+	fn returns the number of tokens it handled.
+	Returns (tokens, seconds, rounds)
+	'''
+	tokens = 0
+	spent = 0.0
+	rounds = 0
+	while spent < min_time or not tokens:
+		state = setup() if setup else None
+		t0 = time.perf_counter()
+		n = fn(state)
+		spent += time.perf_counter() - t0
+		tokens += n
+		rounds += 1
+	return (tokens, spent, rounds)
+
+
+
+def bench_call_matchers_nh(game, min_time):
+	words = speaker_words(game)
+	def run(a):
+		cm = a.call_matchers_nh
+		for w in words:
+			cm(w)
+		return len(words)
+	return timed(run, lambda: learner(game), min_time)
+
+
+
+def bench_dissimilate(game, min_time):
+	a = learner(game)
+	syllables = [(w.onset, w.get_vowel(), w.coda) for w in speaker_words(game)]
+	def run(state):
+		d = a.dissimilate
+		for syl in syllables:
+			d(syl)
+		return len(syllables)
+	return timed(run, None, min_time)
+
+
+
+def bench_get_vowel(game, min_time):
+	words = speaker_words(game)
+	def run(state):
+		for w in words:
+			w.get_vowel()
+		return len(words)
+	return timed(run, None, min_time)
+
+
+
+def bench_settle_conflicts(game, min_time):
+	pop = [a for g in game.population for a in g if a.repertoire]
+	words = speaker_words(game)
+	def setup():
+		#copying drops what settle_conflicts knows, so settle each copy, then let it hear a token
+		agents = copy.deepcopy(pop)
+		with quiet():
+			for (i, a) in enumerate(agents):
+				a.settle_conflicts()
+				a.call_matchers_nh(words[i % len(words)])
+		return agents
+	def run(agents):
+		for a in agents:
+			a.settle_conflicts()
+		return len(agents)
+	return timed(run, setup, min_time)
+
+
+
+def bench_step(game, min_time):
+	'''One step per round, each on a fresh copy of the warmed-up game'''
+	def run(g):
+		n = g.total_interactions
+		with quiet():
+			g.step()
+		return g.total_interactions - n
+	return timed(run, lambda: copy.deepcopy(game), min_time)
+
+
+
+def bench_percept_protos(game, min_time):
+	def run(state):
+		with quiet():
+			game.percept_protos(game.age_adult, game.age_limit)
+		return sum(len(a.idio) for g in game.population for a in g if a.age >= game.age_adult)
+	return timed(run, None, min_time)
+
+
+
+def bench_find_sound_changes(game, min_time):
+	def run(state):
+		with quiet():
+			game.find_sound_changes()
+		game.str_buf = []
+		return sum(len(a.idio) for g in game.population for a in g)
+	return timed(run, None, min_time)
+
+
+
+CASES = (("call_matchers_nh", bench_call_matchers_nh),
+		 ("dissimilate", bench_dissimilate),
+		 ("get_vowel", bench_get_vowel),
+		 ("settle_conflicts", bench_settle_conflicts),
+		 ("step", bench_step),
+		 ("percept_protos", bench_percept_protos),
+		 ("find_sound_changes", bench_find_sound_changes))
+
+
+
+def game_state(game):
+	'''The state of a game as plain values, for comparing runs'''
+	agents = []
+	for g in game.population:
+		for a in g:
+			rep = [(v.e1, v.e2, v.length, v.weight, v.name) for v in a.repertoire]
+			words = sorted( (k, w.key, w.percept.e1, w.percept.e2, w.percept.length,
+							 [(v.e1, v.e2, n) for (v, n) in w.history()]) for (k, w) in a.idio.items() )
+			agents.append((a.name, a.age, a.perception, a.new_vowels, a.merges, rep, words))
+	protos = sorted( (k, p.e1, p.e2, p.length, p.carriers) for (k, p) in game.convention.proto_dict.items() )
+	return (game.step_count, game.total_interactions, agents, protos)
+
+
+
+def check_checkpoint(game):
+	'''A game saved, loaded and stepped matches the same game stepped without the round trip'''
+	with tempfile.TemporaryDirectory() as d:
+		path = os.path.join(d, "checkpoint")
+		with quiet():
+			game.save_checkpoint(path)
+			for i in range(CHECK_STEPS):
+				game.step()
+			resumed = Game_fns.Game_fns()
+			resumed.load_checkpoint(path)
+			for i in range(CHECK_STEPS):
+				resumed.step()
+	return game_state(resumed) == game_state(game)
+
+
+
+def phones(a):
+	return [(v.e1, v.e2, v.length, v.weight, v.name) for v in a.repertoire]
+
+
+
+def check_settle_conflicts(game, rounds = 10):
+	'''
+	settle_conflicts leaves the same repertoire as settle_conflicts_sweep,
+	with the agents' own margin and with a wide one (so phones shift and merge)
+	'''
+	pop = [a for g in game.population for a in g if a.repertoire]
+	same = True
+	for prox in (None, 1.0):
+		for (n, a) in enumerate(pop):
+			inc = copy.deepcopy(a)
+			sweep = copy.deepcopy(a)
+			if prox is not None:
+				inc.prox_margin = sweep.prox_margin = prox
+			for r in range(rounds):
+				Rng.reseed(SEED, "check", n, r)
+				for i in sample(range(len(inc.repertoire)), max(1, len(inc.repertoire) // 3)):
+					dw = uniform(0, .5)
+					inc.repertoire[i].weight += dw
+					sweep.repertoire[i].weight += dw
+				with quiet():
+					Rng.reseed(SEED, "settle", n, r)
+					inc.settle_conflicts()
+					Rng.reseed(SEED, "settle", n, r)
+					sweep.settle_conflicts_sweep()
+				if phones(inc) != phones(sweep):
+					same = False
+					break
+	return same
+
+
+
+def check_diffuse_parallel(game):
+	'''Steps run with workers match the same steps run in this process with freeze_speakers'''
+	states = []
+	with tempfile.TemporaryDirectory() as d:
+		path = os.path.join(d, "checkpoint")
+		with quiet():
+			game.save_checkpoint(path)
+			for workers in (0, 2):
+				g = Game_fns.Game_fns()
+				g.load_checkpoint(path)
+				g.freeze_speakers = True
+				g.workers = workers
+				for i in range(CHECK_STEPS):
+					g.step()
+				g.close_workers()
+				states.append(game_state(g))
+	return states[0] == states[1]
+
+
+
+CHECKS = (("checkpoint", check_checkpoint),
+		  ("settle_conflicts", check_settle_conflicts),
+		  ("diffuse_parallel", check_diffuse_parallel))
+
+
+
+def run_checks(checks = CHECKS):
+	'''Run each check on a fresh BASE game. Returns (lines, whether all passed)'''
+	lines = []
+	passed = True
+	for (name, fn) in checks:
+		ok = fn(make_game(BASE))
+		passed = passed and ok
+		lines.append("{0:24}{1}".format(name, "ok" if ok else "FAILED"))
+	return (lines, passed)
+
+
+
+def points(axes):
+	'''(label, params) for each point on the chosen axes'''
+	found = []
+	for axis in axes:
+		(key, values) = AXES[axis]
+		for v in values:
+			p = dict(BASE)
+			p[key] = v
+			found.append(("{0}={1}".format(axis, v), p))
+	return found
+
+
+
+def run_suite(axes, cases = CASES, min_time = MIN_TIME):
+	'''
+	Time every case at every axis point.
+	Returns {label: {case: {"tokens", "seconds", "rounds", "tokens_per_s", "us_per_token"}}}
+	'''
+	results = dict()
+	for (label, params) in points(axes):
+		game = make_game(params)
+		row = results[label] = dict()
+		for (name, fn) in cases:
+			Rng.reseed(SEED, "bench", label, name)
+			(tokens, spent, rounds) = fn(game, min_time)
+			row[name] = {"tokens": tokens, "seconds": spent, "rounds": rounds,
+						 "tokens_per_s": tokens / spent,
+						 "us_per_token": 1e6 * spent / tokens}
+			if name == "step":
+				row[name]["ms_per_step"] = 1e3 * spent / rounds	#one step per round
+	return results
+
+
+
+def compare(results, baseline, tolerance):
+	'''
+	Lines comparing results with a stored baseline, and whether anything slowed down.
+	A case is SLOWER/FASTER when its time per token moved by more than tolerance
+	'''
+	lines = []
+	slower = False
+	for (label, row) in results.items():
+		base_row = baseline.get(label, dict())
+		for (name, r) in row.items():
+			b = base_row.get(name)
+			if b is None:
+				lines.append("{0:24}{1:20}{2:>12}".format(label, name, "new"))
+				continue
+			ratio = r["us_per_token"] / b["us_per_token"]
+			mark = ""
+			if ratio > 1 + tolerance:
+				mark = "SLOWER"
+				slower = True
+			elif ratio < 1 - tolerance:
+				mark = "FASTER"
+			lines.append("{0:24}{1:20}{2:12.2f}{3:12.2f}{4:8.2f}x {5}".format(
+				label, name, b["us_per_token"], r["us_per_token"], ratio, mark))
+	return (lines, slower)
+
+
+
+def table(results):
+	lines = ["{0:24}{1:20}{2:>14}{3:>14}".format("point", "case", "tokens/s", "us/token")]
+	for (label, row) in results.items():
+		for (name, r) in row.items():
+			s = "{0:24}{1:20}{2:14.0f}{3:14.2f}".format(label, name, r["tokens_per_s"], r["us_per_token"])
+			if "ms_per_step" in r:
+				s += "   {0:.1f} ms/step".format(r["ms_per_step"])
+			lines.append(s)
+	return lines
+
+
+
+def main(argv = None):
+	ap = argparse.ArgumentParser(description = "Time the VoSS hot paths on seeded games.")
+	ap.add_argument("--axis", default = "all", choices = sorted(AXES) + ["all"])
+	ap.add_argument("--case", action = "append", help = "only run this case (repeatable)")
+	ap.add_argument("--quick", action = "store_true", help = "one round per case")
+	ap.add_argument("--save", help = "write the results as a baseline file")
+	ap.add_argument("--baseline", help = "compare with a baseline file")
+	ap.add_argument("--tolerance", type = float, default = .25, help = "relative change to report (default .25)")
+	ap.add_argument("--check", action = "store_true", help = "run the CHECKS instead of timing")
+	args = ap.parse_args(argv)
+
+	if args.check:
+		(lines, passed) = run_checks()
+		print("\n".join(lines))
+		return 0 if passed else 1
+
+	axes = sorted(AXES) if args.axis == "all" else [args.axis]
+	cases = CASES
+	if args.case:
+		names = dict(CASES)
+		bad = [c for c in args.case if c not in names]
+		if bad:
+			print("unknown case", ", ".join(bad), file = sys.stderr)
+			return 2
+		cases = [(c, names[c]) for c in args.case]
+	min_time = 0 if args.quick else MIN_TIME
+
+	results = run_suite(axes, cases, min_time)
+	print("\n".join(table(results)))
+
+	status = 0
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)["results"]
+		(lines, slower) = compare(results, baseline, args.tolerance)
+		print("\n{0:24}{1:20}{2:>12}{3:>12}{4:>9}".format("point", "case", "base us", "now us", "ratio"))
+		print("\n".join(lines))
+		if slower:
+			status = 1
+	if args.save:
+		with open(args.save, "w") as f:
+			json.dump({"seed": SEED, "base": BASE, "warmup_steps": WARMUP_STEPS, "results": results}, f, indent = 1)
+	return status
+
+
+
+if __name__ == "__main__":
+	sys.exit(main())